@@ -1,21 +1,43 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, abort, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, jsonify, make_response, session, send_from_directory, stream_with_context
+from markupsafe import Markup, escape
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, event, exists, func, inspect, literal, literal_column, or_, select, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from flask_admin import Admin
+from flask_admin import Admin, expose
+from flask_admin.actions import action
 from flask_admin.contrib.sqla import ModelView
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, TextAreaField, SubmitField
-from wtforms.validators import DataRequired, Email
+from wtforms import HiddenField, StringField, TextAreaField, SubmitField
+from wtforms.validators import DataRequired, Email, ValidationError
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import wraps
+import base64
+import click
+import hashlib
+import json
+import mimetypes
 import os
+import threading
+import time
 import uuid
-from PIL import Image
 from config import config
 from dotenv import load_dotenv
 from flask_mail import Mail, Message
+from newsletter_mailer.rate_limiter import AdaptiveRateLimiter
+from page_cache import PageCache
+from image_derivatives import generate_derivatives, load_description
+from static_assets import ENCODINGS, build_assets, is_unique_upload, load_manifest
+from chunked_uploads import ChunkedUploads, UploadError
+from search_index import fold, fts5_query, make_excerpt, plain_text, query_terms, tsquery
+from dispatch_scheduler import DispatchScheduler, parse_shares
+from subscriber_io import EXPORT_FIELDS, FORMATS, InvalidRow, csv_lines, format_for, ndjson_lines, read_rows
 
 # Load environment variables first
 load_dotenv('config.env')
@@ -33,6 +55,13 @@ login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 admin = Admin(app, name='Vlasia Blog Admin', template_mode='bootstrap3')
 mail = Mail(app)
+page_cache = PageCache(max_entries=app.config['PAGE_CACHE_MAX_ENTRIES'], ttl=app.config['PAGE_CACHE_TTL'])
+version_cache = PageCache(max_entries=1024, ttl=app.config['CONTENT_VERSION_TTL'])
+dispatch_scheduler = DispatchScheduler(
+    shares=parse_shares(app.config['DISPATCH_PRIORITY_SHARES']),
+    preemptive=[p.strip() for p in app.config['DISPATCH_PREEMPTIVE_PRIORITIES'].split(',') if p.strip()],
+    aging_hours=app.config['DISPATCH_AGING_HOURS']
+)
 
 # Models
 class User(UserMixin, db.Model):
@@ -48,16 +77,31 @@ class Article(db.Model):
     content = db.Column(db.Text, nullable=False)
     category = db.Column(db.String(100), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     image_path = db.Column(db.String(500))
     media_type = db.Column(db.String(10))  # 'image' or 'video'
+    image_variants = db.Column(db.Text)  # JSON description of the resized/WebP copies, see image_derivatives
+    
+    __table_args__ = (
+        db.Index('ix_article_created_at', 'created_at'),
+        db.Index('ix_article_category_created_at', 'category', 'created_at'),
+        db.Index('ix_article_updated_at', 'updated_at'),
+    )
 
 class News(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     media_path = db.Column(db.String(500))
     media_type = db.Column(db.String(10))
+    media_variants = db.Column(db.Text)  # JSON description of the resized/WebP copies, see image_derivatives
+    
+    __table_args__ = (
+        db.Index('ix_news_created_at', 'created_at'),
+        db.Index('ix_news_updated_at', 'updated_at'),
+    )
 
 class Moment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -66,18 +110,27 @@ class Moment(db.Model):
     category = db.Column(db.String(100), nullable=False)
     media_path = db.Column(db.String(500), nullable=False)
     media_type = db.Column(db.String(10), nullable=False)  # 'image' or 'video'
+    media_variants = db.Column(db.Text)  # JSON description of the resized/WebP copies, see image_derivatives
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_moment_created_at', 'created_at'),
+        db.Index('ix_moment_category_created_at', 'category', 'created_at'),
+        db.Index('ix_moment_updated_at', 'updated_at'),
+    )
+    
+    CATEGORY_LABELS = {
+        'landscape': 'Τοπία',
+        'village': 'Χωριό',
+        'people': 'Ανθρώποι',
+        'events': 'Εκδηλώσεις',
+        'nature': 'Φύση'
+    }
     
     @property
     def category_display(self):
-        category_map = {
-            'landscape': 'Τοπία',
-            'village': 'Χωριό',
-            'people': 'Ανθρώποι',
-            'events': 'Εκδηλώσεις',
-            'nature': 'Φύση'
-        }
-        return category_map.get(self.category, self.category)
+        return self.CATEGORY_LABELS.get(self.category, self.category)
     
     @property
     def is_image(self):
@@ -93,6 +146,19 @@ class NewsletterSubscriber(db.Model):
     subscribed_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     welcome_email_sent = db.Column(db.Boolean, default=False)  # Track if welcome email was sent
+    categories = db.Column(db.String(200))  # Comma-separated announcement categories wanted; NULL = all
+    
+    __table_args__ = (
+        # Welcome-email queue and the keyset-paginated newsletter recipients
+        db.Index('ix_newsletter_subscriber_active_welcome', 'is_active', 'welcome_email_sent', 'subscribed_at'),
+        db.Index('ix_newsletter_subscriber_active_id', 'is_active', 'id'),
+    )
+    
+    @property
+    def category_list(self):
+        """Announcement categories this subscriber receives (mandatory ones included)"""
+        wanted = Announcement.CATEGORY_LABELS if self.categories is None else filter(None, self.categories.split(','))
+        return sorted(set(wanted) | set(Announcement.MANDATORY_CATEGORIES))
 
 class ContactMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -103,6 +169,15 @@ class ContactMessage(db.Model):
     message = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     notification_sent = db.Column(db.Boolean, default=False)  # Track if notification email was sent
+    notification_sending_since = db.Column(db.DateTime)  # Lease held while a notification is being sent
+    
+    __table_args__ = (
+        db.Index('ix_contact_message_created_at', 'created_at'),
+        # Only the (few) messages still waiting for a notification
+        db.Index('ix_contact_message_unnotified', 'created_at',
+                 sqlite_where=notification_sent == False,
+                 postgresql_where=notification_sent == False),
+    )
 
 class NewsletterSent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -114,6 +189,12 @@ class NewsletterSent(db.Model):
     # Relationships
     subscriber = db.relationship('NewsletterSubscriber', backref='sent_emails')
     announcement = db.relationship('Announcement', backref='sent_emails')
+    
+    __table_args__ = (
+        # One delivery record per subscriber and announcement; also serves the anti-join
+        db.Index('uq_newsletter_sent_user_announcement', 'user_id', 'announcement_id', unique=True),
+        db.Index('ix_newsletter_sent_announcement_id', 'announcement_id'),
+    )
 
 class Announcement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -123,7 +204,744 @@ class Announcement(db.Model):
     priority = db.Column(db.String(20), default='normal')  # 'low', 'normal', 'high', 'urgent'
     is_published = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     sent_to_newsletter = db.Column(db.Boolean, default=False)  # Track if sent to newsletter
+    # Delivery progress, kept up to date by the mailer acknowledgements
+    recipients_target = db.Column(db.Integer)  # Subscribers in its segment when sending started
+    sent_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    failed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    sending_since = db.Column(db.DateTime)  # Lease held while the site sends it itself
+    
+    __table_args__ = (
+        db.Index('ix_announcement_published_sent_created', 'is_published', 'sent_to_newsletter', 'created_at'),
+        db.Index('ix_announcement_published_created', 'is_published', 'created_at'),
+        db.Index('ix_announcement_updated_at', 'updated_at'),
+    )
+    
+    CATEGORY_LABELS = {
+        'general': 'Γενική ανακοίνωση',
+        'event': 'Εκδήλωση',
+        'important': 'Σημαντική ανακοίνωση',
+        'news': 'Νέα'
+    }
+    # Sent to every active subscriber whatever their preferences
+    MANDATORY_CATEGORIES = ('important',)
+    
+    @property
+    def delivered_count(self):
+        return (self.sent_count or 0) + (self.failed_count or 0)
+
+class SegmentMembership(db.Model):
+    """Precomputed newsletter segment: the active subscribers who receive one announcement category"""
+    category = db.Column(db.String(100), primary_key=True)
+    subscriber_id = db.Column(db.Integer, db.ForeignKey('newsletter_subscriber.id', ondelete='CASCADE'), primary_key=True)
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # Name of the registered job handler
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments for the handler
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Workers pick the oldest runnable job
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
+class SearchDocument(db.Model):
+    """Full-text search entry for one article, news item or announcement (see Full-text search)"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'article', 'news' or 'announcement'
+    object_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)  # Plain text of the content, for excerpts
+    title_terms = db.Column(db.Text, nullable=False)  # Folded title and body, what the index matches
+    body_terms = db.Column(db.Text, nullable=False)
+    is_public = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('uq_search_document_kind_object', 'kind', 'object_id', unique=True),
+    )
+
+# Schema migrations
+def remove_duplicate_newsletter_sent():
+    """Keep only the first delivery record per subscriber/announcement pair"""
+    result = db.session.execute(text(
+        'DELETE FROM newsletter_sent WHERE id NOT IN '
+        '(SELECT MIN(id) FROM newsletter_sent GROUP BY user_id, announcement_id)'
+    ))
+    db.session.commit()
+    return result.rowcount
+
+def create_missing_indexes():
+    """Create the declared indexes that an existing database doesn't have yet
+    
+    On PostgreSQL they are built with CREATE INDEX CONCURRENTLY, so the tables
+    stay writable while the index is built.
+    """
+    engine = db.engine
+    existing = {
+        table_name: {index['name'] for index in inspect(engine).get_indexes(table_name)}
+        for table_name in inspect(engine).get_table_names()
+    }
+    
+    created = []
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for table in db.metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing.get(table.name, set()):
+                    continue
+                
+                ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+                if engine.dialect.name == 'postgresql':
+                    ddl = ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+                    ddl = ddl.replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1)
+                
+                connection.execute(text(ddl))
+                created.append(index.name)
+    
+    return created
+
+def add_missing_columns():
+    """Add the declared columns that an existing table doesn't have yet
+    
+    Returns the added columns as (table name, column name) pairs.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    added = []
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += ' NOT NULL'
+                
+                connection.execute(text(ddl))
+                added.append((table.name, column.name))
+    
+    return added
+
+def backfill_announcement_counters():
+    """Fill the delivery counters of existing announcements from their NewsletterSent rows"""
+    counts = db.session.query(
+        NewsletterSent.announcement_id, NewsletterSent.status, func.count(NewsletterSent.id)
+    ).group_by(NewsletterSent.announcement_id, NewsletterSent.status).all()
+    
+    totals = {}
+    for announcement_id, status, count in counts:
+        sent, failed = totals.get(announcement_id, (0, 0))
+        if status == 'failed':
+            failed += count
+        else:
+            sent += count
+        totals[announcement_id] = (sent, failed)
+    
+    for announcement in Announcement.query.all():
+        announcement.sent_count, announcement.failed_count = totals.get(announcement.id, (0, 0))
+        if announcement.sent_to_newsletter:
+            announcement.recipients_target = announcement.delivered_count
+    db.session.commit()
+    return len(totals)
+
+def backfill_updated_at():
+    """Give rows from before the updated_at columns existed their creation time"""
+    for model in (Article, News, Moment, Announcement):
+        model.query.filter(model.updated_at.is_(None)).update(
+            {model.updated_at: func.coalesce(model.created_at, func.current_timestamp())},
+            synchronize_session=False
+        )
+    db.session.commit()
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Bring an existing database up to date with the models (tables, columns and indexes)"""
+    had_search_index = inspect(db.engine).has_table(SearchDocument.__tablename__)
+    had_segments = inspect(db.engine).has_table(SegmentMembership.__tablename__)
+    db.create_all()
+    
+    added = add_missing_columns()
+    for table_name, column_name in added:
+        print(f"✅ Added column {table_name}.{column_name}")
+    
+    if ('announcement', 'sent_count') in added:
+        backfilled = backfill_announcement_counters()
+        print(f"📊 Backfilled delivery counters for {backfilled} announcements")
+    
+    if any(column_name == 'updated_at' for _, column_name in added):
+        backfill_updated_at()
+        print("🕒 Backfilled updated_at from created_at")
+    
+    removed = remove_duplicate_newsletter_sent()
+    if removed:
+        print(f"🧹 Removed {removed} duplicate newsletter_sent rows")
+    
+    for index_name in create_missing_indexes():
+        print(f"✅ Created index {index_name}")
+    
+    if not had_search_index:
+        indexed = rebuild_search_index()
+        print(f"🔎 Indexed {indexed} documents for search")
+    
+    if not had_segments:
+        refresh_segment_membership(db.session.connection())
+        db.session.commit()
+        print("👥 Built the newsletter segments")
+    
+    print("🎯 Database is up to date")
+
+# Work notifications for the mailer daemons
+# Long-poll requests on /api/wait-for-work sleep on this condition and are
+# woken as soon as a commit adds or changes rows the mailers care about.
+work_condition = threading.Condition()
+WORK_MODELS = (Announcement, NewsletterSubscriber, ContactMessage)
+
+@event.listens_for(Session, 'after_flush')
+def track_new_work(session, flush_context):
+    if any(isinstance(obj, WORK_MODELS) for obj in list(session.new) + list(session.dirty)):
+        session.info['new_work'] = True
+
+@event.listens_for(Session, 'after_commit')
+def signal_new_work(session):
+    if session.info.pop('new_work', False):
+        with work_condition:
+            work_condition.notify_all()
+
+@event.listens_for(Session, 'after_rollback')
+def discard_new_work(session):
+    session.info.pop('new_work', False)
+
+# Filter facets for the listing pages
+# The distinct values (with counts) behind the filter dropdowns are computed
+# once and kept until a commit touches the model. They are stamped with the
+# model's shared content version (content_stamp), so facets computed before
+# an edit made through another worker are recomputed too.
+FACET_CACHE_TTL = 600
+facet_cache = PageCache(max_entries=8, ttl=FACET_CACHE_TTL)
+FACET_MODELS = {Announcement: 'announcement', Moment: 'moment'}
+
+def count_facet(column, *criteria):
+    """[(value, count), ...] for one column, in value order"""
+    return db.session.query(column, func.count()).filter(*criteria).group_by(column).order_by(column).all()
+
+def get_announcement_facets():
+    """Categories and priorities of the published announcements, with counts"""
+    stamp = content_stamp(['announcement'])
+    cached = facet_cache.get('announcement')
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    
+    facets = {
+        'category': count_facet(Announcement.category, Announcement.is_published == True),
+        'priority': count_facet(Announcement.priority, Announcement.is_published == True),
+    }
+    facet_cache.set('announcement', (stamp, facets), tags=['announcement'])
+    return facets
+
+def get_moment_facets():
+    """Categories of the moments, with counts"""
+    stamp = content_stamp(['moment'])
+    cached = facet_cache.get('moment')
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    
+    facets = {'category': count_facet(Moment.category)}
+    facet_cache.set('moment', (stamp, facets), tags=['moment'])
+    return facets
+
+@event.listens_for(Session, 'after_flush')
+def track_facet_changes(session, flush_context):
+    changed = {
+        tag for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        for model, tag in FACET_MODELS.items() if isinstance(obj, model)
+    }
+    if changed:
+        session.info.setdefault('facet_changes', set()).update(changed)
+
+@event.listens_for(Session, 'after_commit')
+def refresh_facets(session):
+    changed = session.info.pop('facet_changes', None)
+    if changed:
+        facet_cache.invalidate(*changed)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_facet_changes(session):
+    session.info.pop('facet_changes', None)
+
+# Newsletter segments
+# segment_membership holds, per announcement category, the active subscribers
+# who want it, so the recipients of an announcement are one index range scan
+# on (category, subscriber_id). It is recomputed with set-based statements for
+# the subscribers a flush or a bulk import touched. Subscribers who join or
+# leave the segment of an announcement mid-send move its recipients target.
+def sending_announcements(connection):
+    """(id, category) of the announcements whose sending has started but not finished"""
+    announcements = Announcement.__table__
+    return connection.execute(select(announcements.c.id, announcements.c.category).where(
+        announcements.c.recipients_target.is_not(None),
+        announcements.c.sent_to_newsletter == False
+    )).all()
+
+def segment_members(connection, categories, *criteria):
+    """{(category, subscriber_id)} of the segment_membership rows of these categories matching criteria"""
+    membership = SegmentMembership.__table__
+    return set(connection.execute(select(membership.c.category, membership.c.subscriber_id).where(
+        membership.c.category.in_(categories), *criteria
+    )).all())
+
+def adjust_recipients_targets(connection, sending, before, after):
+    """Move the targets of announcements being sent by the subscribers who joined or left their segment
+    
+    before and after are segment_members() snapshots. Subscribers who already
+    have a delivery recorded are in the counters and don't move the target.
+    """
+    announcements = Announcement.__table__
+    sent = NewsletterSent.__table__
+    for announcement_id, category in sending:
+        joined = {subscriber_id for member_category, subscriber_id in after - before if member_category == category}
+        left = {subscriber_id for member_category, subscriber_id in before - after if member_category == category}
+        if not joined and not left:
+            continue
+        
+        delivered = set(connection.execute(select(sent.c.user_id).where(
+            sent.c.announcement_id == announcement_id, sent.c.user_id.in_(joined | left)
+        )).scalars())
+        change = len(joined - delivered) - len(left - delivered)
+        if change:
+            connection.execute(announcements.update().where(announcements.c.id == announcement_id).values(
+                recipients_target=announcements.c.recipients_target + change,
+                updated_at=announcements.c.updated_at  # Delivery progress, not a content change
+            ))
+
+def refresh_segment_membership(connection, *criteria):
+    """Recompute the segments of the subscribers matching criteria (every subscriber without criteria)"""
+    membership = SegmentMembership.__table__
+    subscribers = NewsletterSubscriber.__table__
+    
+    sending = sending_announcements(connection)
+    categories = {category for _, category in sending}
+    touched = [membership.c.subscriber_id.in_(select(subscribers.c.id).where(*criteria))] if criteria else []
+    before = segment_members(connection, categories, *touched) if sending else set()
+    
+    if criteria:
+        connection.execute(membership.delete().where(
+            membership.c.subscriber_id.in_(select(subscribers.c.id).where(*criteria))
+        ))
+    else:
+        connection.execute(membership.delete())
+    
+    for category in Announcement.CATEGORY_LABELS:
+        wanted = [subscribers.c.is_active == True, *criteria]
+        if category not in Announcement.MANDATORY_CATEGORIES:
+            wanted.append(or_(
+                subscribers.c.categories.is_(None),
+                (literal(',') + subscribers.c.categories + literal(',')).contains(f',{category},')
+            ))
+        connection.execute(membership.insert().from_select(
+            ['category', 'subscriber_id'],
+            select(literal(category), subscribers.c.id).where(*wanted)
+        ))
+    
+    if sending:
+        adjust_recipients_targets(connection, sending, before, segment_members(connection, categories, *touched))
+
+@event.listens_for(Session, 'after_flush')
+def sync_segment_membership(session, flush_context):
+    """Keep the segments of subscribers saved through the ORM (forms, admin) up to date"""
+    changed = [
+        obj.id for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, NewsletterSubscriber) and (obj in session.new or any(
+            inspect(obj).attrs[field].history.has_changes() for field in ('is_active', 'categories')
+        ))
+    ]
+    removed = [obj.id for obj in session.deleted if isinstance(obj, NewsletterSubscriber)]
+    
+    if changed:
+        refresh_segment_membership(session.connection(), NewsletterSubscriber.id.in_(changed))
+    if removed:
+        connection = session.connection()
+        sending = sending_announcements(connection)
+        if sending:
+            before = segment_members(connection, {category for _, category in sending},
+                                     SegmentMembership.subscriber_id.in_(removed))
+            adjust_recipients_targets(connection, sending, before, set())
+        connection.execute(SegmentMembership.__table__.delete().where(
+            SegmentMembership.subscriber_id.in_(removed)
+        ))
+
+def segment_recipients(category):
+    """(query of subscriber (id, email), subscriber id column to page and order by) for a category's segment
+    
+    Categories outside CATEGORY_LABELS have no segment and go to every active subscriber.
+    """
+    query = db.session.query(NewsletterSubscriber.id, NewsletterSubscriber.email)
+    if category not in Announcement.CATEGORY_LABELS:
+        return query.filter(NewsletterSubscriber.is_active == True), NewsletterSubscriber.id
+    
+    query = query.select_from(SegmentMembership).join(
+        NewsletterSubscriber, NewsletterSubscriber.id == SegmentMembership.subscriber_id
+    ).filter(SegmentMembership.category == category)
+    return query, SegmentMembership.subscriber_id
+
+@app.template_global()
+def newsletter_categories():
+    """(value, label) of the announcement categories subscribers can opt out of"""
+    return [
+        (category, label) for category, label in Announcement.CATEGORY_LABELS.items()
+        if category not in Announcement.MANDATORY_CATEGORIES
+    ]
+
+# Full-text search
+# Articles, news and announcements are copied into search_document (folded
+# for accent- and case-insensitive matching, see search_index) in the same
+# flush that saves them, whichever code path saves them. SQLite matches with
+# an FTS5 table kept in step by triggers, PostgreSQL with a GIN index over
+# the tsvector of the folded text.
+SEARCH_MODELS = {
+    # model -> (kind, content field, field that decides if it is public)
+    Article: ('article', 'content', None),
+    News: ('news', 'content', None),
+    Announcement: ('announcement', 'content', 'is_published'),
+}
+SEARCH_KINDS = {'article': 'Άρθρο', 'news': 'Νέο', 'announcement': 'Ανακοίνωση'}
+SEARCH_PAGE_SIZE = 10
+SEARCH_MAX_PAGE_SIZE = 50
+
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_document_fts USING fts5(
+        title_terms, body_terms, content='search_document', content_rowid='id', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_document_ai AFTER INSERT ON search_document BEGIN
+        INSERT INTO search_document_fts (rowid, title_terms, body_terms) VALUES (new.id, new.title_terms, new.body_terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_document_ad AFTER DELETE ON search_document BEGIN
+        INSERT INTO search_document_fts (search_document_fts, rowid, title_terms, body_terms)
+        VALUES ('delete', old.id, old.title_terms, old.body_terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_document_au AFTER UPDATE ON search_document BEGIN
+        INSERT INTO search_document_fts (search_document_fts, rowid, title_terms, body_terms)
+        VALUES ('delete', old.id, old.title_terms, old.body_terms);
+        INSERT INTO search_document_fts (rowid, title_terms, body_terms) VALUES (new.id, new.title_terms, new.body_terms);
+    END""",
+]
+POSTGRES_SEARCH_VECTOR = (
+    "(setweight(to_tsvector('simple', search_document.title_terms), 'A') || "
+    "setweight(to_tsvector('simple', search_document.body_terms), 'B'))"
+)
+POSTGRES_SEARCH_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_search_document_vector ON search_document USING gin ({POSTGRES_SEARCH_VECTOR})",
+]
+
+@event.listens_for(SearchDocument.__table__, 'after_create')
+def create_search_index(table, connection, **kw):
+    """Create the full-text index that matches search_document rows"""
+    statements = {'sqlite': SQLITE_SEARCH_DDL, 'postgresql': POSTGRES_SEARCH_DDL}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.execute(text(statement))
+
+def search_document_values(obj):
+    kind, content_field, public_field = SEARCH_MODELS[type(obj)]
+    body = plain_text(getattr(obj, content_field))
+    return {
+        'kind': kind,
+        'object_id': obj.id,
+        'title': obj.title,
+        'body': body,
+        'title_terms': fold(obj.title or ''),
+        'body_terms': fold(body),
+        'is_public': bool(getattr(obj, public_field)) if public_field else True,
+        'created_at': obj.created_at,
+    }
+
+@event.listens_for(Session, 'after_flush')
+def sync_search_index(session, flush_context):
+    """Bring the search entries of the flushed articles, news and announcements up to date"""
+    table = SearchDocument.__table__
+    changed = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if type(obj) in SEARCH_MODELS and (obj in session.new or any(
+            inspect(obj).attrs[field].history.has_changes()
+            for field in ('title', SEARCH_MODELS[type(obj)][1], SEARCH_MODELS[type(obj)][2]) if field
+        ))
+    ]
+    removed = [obj for obj in session.deleted if type(obj) in SEARCH_MODELS]
+    if not changed and not removed:
+        return
+    
+    connection = session.connection()
+    for obj in changed + removed:
+        connection.execute(table.delete().where(
+            table.c.kind == SEARCH_MODELS[type(obj)][0], table.c.object_id == obj.id
+        ))
+    if changed:
+        connection.execute(table.insert(), [search_document_values(obj) for obj in changed])
+
+def rebuild_search_index():
+    """Re-create every search entry from the content tables; returns how many were indexed"""
+    table = SearchDocument.__table__
+    db.session.execute(table.delete())
+    indexed = 0
+    for model in SEARCH_MODELS:
+        for obj in model.query.order_by(model.id).yield_per(500):
+            db.session.execute(table.insert(), [search_document_values(obj)])
+            indexed += 1
+    db.session.commit()
+    return indexed
+
+def search_query(terms, kinds=None, public_only=True):
+    """ORM query of (SearchDocument, rank) matching every term, best match first"""
+    if db.engine.dialect.name == 'postgresql':
+        tsq = func.to_tsquery('simple', tsquery(terms))
+        rank = func.ts_rank(literal_column(POSTGRES_SEARCH_VECTOR), tsq).label('rank')
+        query = db.session.query(SearchDocument, rank).filter(literal_column(POSTGRES_SEARCH_VECTOR).op('@@')(tsq))
+        order = rank.desc()
+    else:
+        matches = text(
+            'SELECT rowid AS id, bm25(search_document_fts, 4.0, 1.0) AS rank '
+            'FROM search_document_fts WHERE search_document_fts MATCH :match'
+        ).bindparams(match=fts5_query(terms)).columns(id=db.Integer, rank=db.Float).subquery()
+        query = db.session.query(SearchDocument, matches.c.rank).join(matches, matches.c.id == SearchDocument.id)
+        order = matches.c.rank  # bm25: lower is better
+    
+    if kinds:
+        query = query.filter(SearchDocument.kind.in_(kinds))
+    if public_only:
+        query = query.filter(SearchDocument.is_public == True)
+    return query.order_by(order, SearchDocument.created_at.desc())
+
+def search_result_url(document):
+    if document.kind == 'article':
+        return url_for('article_detail', article_id=document.object_id)
+    if document.kind == 'news':
+        return url_for('news_detail', news_id=document.object_id)
+    return url_for('announcements') + f'#announcement-{document.object_id}'
+
+def search_content(query, kinds=None, page=1, per_page=SEARCH_PAGE_SIZE):
+    """One page of ranked public results for a search box query, as (results, total)"""
+    terms = query_terms(query)
+    if not terms:
+        return [], 0
+    
+    matches = search_query(terms, kinds)
+    total = matches.order_by(None).count()
+    rows = matches.limit(per_page).offset((page - 1) * per_page).all()
+    results = [
+        {
+            'kind': document.kind,
+            'kind_display': SEARCH_KINDS[document.kind],
+            'id': document.object_id,
+            'title': document.title,
+            'excerpt': make_excerpt(document.body, terms),
+            'url': search_result_url(document),
+            'created_at': document.created_at.strftime('%d/%m/%Y') if document.created_at else None,
+            'rank': rank,
+        }
+        for document, rank in rows
+    ]
+    return results, total
+
+# Background jobs
+# Side effects that are slow or talk to other servers (emails, image
+# processing) are stored as Job rows in the same transaction as the change
+# that causes them, and run by a small pool of worker threads once that
+# transaction commits. Failed jobs are retried with exponential backoff and
+# stay visible in the admin. Running `flask run-jobs` as a separate process
+# works too; JOB_WORKERS=0 keeps the web workers from running jobs themselves.
+JOB_POLL_INTERVAL = 5  # seconds between checks for delayed jobs
+JOB_RETRY_DELAY = 30  # seconds before the first retry, doubled for every further attempt
+JOB_LOCK_TIMEOUT = 15 * 60  # a job running longer than this is assumed lost with its worker
+JOB_RETENTION = timedelta(days=7)  # finished jobs are pruned after this long
+JOB_HEARTBEAT_INTERVAL = 60  # seconds between lock refreshes from long-running jobs
+JOB_HANDLERS = {}
+
+job_condition = threading.Condition()
+job_workers = []
+job_workers_lock = threading.Lock()
+current_job = threading.local()
+
+def job_handler(kind):
+    """Register a function as the handler for jobs of the given kind"""
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+def enqueue_job(kind, max_attempts=5, **payload):
+    """Add a job to the current transaction; it runs once the transaction commits
+    
+    A job of the same kind and payload that is still queued or running is
+    reused instead of adding a duplicate.
+    """
+    payload = json.dumps(payload, sort_keys=True)
+    job = Job.query.filter(
+        Job.kind == kind,
+        Job.payload == payload,
+        Job.status.in_(['queued', 'running'])
+    ).first()
+    if job is None:
+        job = Job(kind=kind, payload=payload, max_attempts=max_attempts)
+        db.session.add(job)
+    return job
+
+@event.listens_for(Session, 'after_flush')
+def track_new_jobs(session, flush_context):
+    if any(isinstance(obj, Job) and obj.status == 'queued' for obj in list(session.new) + list(session.dirty)):
+        session.info['new_jobs'] = True
+
+@event.listens_for(Session, 'after_commit')
+def wake_job_workers(session):
+    if session.info.pop('new_jobs', False):
+        with job_condition:
+            job_condition.notify_all()
+
+@event.listens_for(Session, 'after_rollback')
+def discard_new_jobs(session):
+    session.info.pop('new_jobs', False)
+
+def claim_next_job():
+    """Mark the oldest runnable job as running and return it, or None when there is nothing to do"""
+    now = datetime.utcnow()
+    runnable = or_(
+        and_(Job.status == 'queued', Job.run_after <= now),
+        and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT))
+    )
+    candidates = db.session.query(Job.id).filter(runnable).order_by(Job.run_after, Job.id).limit(5).all()
+    
+    for (job_id,) in candidates:
+        # Only one worker (in any process) wins the conditional update
+        claimed = db.session.execute(
+            Job.__table__.update()
+            .where(Job.id == job_id, runnable)
+            .values(status='running', locked_at=now, attempts=Job.attempts + 1, updated_at=now)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+def heartbeat_job():
+    """Refresh the lock of the job running on this thread so it isn't taken for lost
+    
+    Long-running handlers call this as they make progress; the update is
+    committed with the handler's next commit.
+    """
+    job_id = getattr(current_job, 'id', None)
+    if job_id is None or time.monotonic() - current_job.heartbeat < JOB_HEARTBEAT_INTERVAL:
+        return
+    
+    db.session.execute(Job.__table__.update().where(Job.id == job_id).values(locked_at=datetime.utcnow()))
+    current_job.heartbeat = time.monotonic()
+
+def run_next_job():
+    """Run one job; returns False when the queue had nothing runnable"""
+    job = claim_next_job()
+    if job is None:
+        return False
+    
+    current_job.id, current_job.heartbeat = job.id, time.monotonic()
+    try:
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            raise LookupError(f"No handler for job kind '{job.kind}'")
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Worker was lost while running the job')
+        
+        handler(**json.loads(job.payload))
+    except Exception as e:
+        current_job.id = None
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.last_error = f"{type(e).__name__}: {e}"
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            print(f"❌ Job {job.id} ({job.kind}) failed after {job.attempts} attempts: {e}")
+        else:
+            job.status = 'queued'
+            job.run_after = datetime.utcnow() + timedelta(seconds=JOB_RETRY_DELAY * 2 ** (job.attempts - 1))
+            print(f"🔄 Job {job.id} ({job.kind}) failed, retrying at {job.run_after:%H:%M:%S}: {e}")
+        db.session.commit()
+        return True
+    
+    current_job.id = None
+    job.status = 'done'
+    job.last_error = None
+    db.session.commit()
+    return True
+
+def prune_finished_jobs():
+    """Delete jobs that finished successfully more than JOB_RETENTION ago"""
+    deleted = Job.query.filter(
+        Job.status == 'done',
+        Job.updated_at < datetime.utcnow() - JOB_RETENTION
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+def run_job_worker(stop_event):
+    """Worker loop: run jobs until the queue is empty, then wait to be woken by a commit"""
+    last_prune = 0.0
+    while not stop_event.is_set():
+        try:
+            with app.app_context():
+                while not stop_event.is_set() and run_next_job():
+                    pass
+                if time.monotonic() - last_prune > 3600:
+                    prune_finished_jobs()
+                    last_prune = time.monotonic()
+        except Exception as e:
+            print(f"Error in job worker: {e}")
+        
+        with job_condition:
+            job_condition.wait(JOB_POLL_INTERVAL)
+
+def start_job_workers(count=None):
+    """Start the job worker threads of this process (once)"""
+    count = app.config['JOB_WORKERS'] if count is None else count
+    with job_workers_lock:
+        if job_workers or count <= 0:
+            return job_workers
+        
+        stop_event = threading.Event()
+        for number in range(count):
+            worker = threading.Thread(target=run_job_worker, args=(stop_event,),
+                                      name=f'job-worker-{number}', daemon=True)
+            worker.start()
+            job_workers.append(worker)
+        return job_workers
+
+@app.before_request
+def ensure_job_workers():
+    if not job_workers:
+        start_job_workers()
+
+@app.cli.command('run-jobs')
+def run_jobs_command():
+    """Run the background job workers in the foreground until interrupted"""
+    workers = start_job_workers(max(app.config['JOB_WORKERS'], 1))
+    print(f"⚙️ Running {len(workers)} job workers, press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("👋 Job workers stopped")
 
 # Forms
 class LoginForm(FlaskForm):
@@ -158,52 +976,298 @@ class AnnouncementForm(FlaskForm):
     priority = StringField('Priority', validators=[DataRequired()])
     submit = SubmitField('Create Announcement')
 
+# Image derivatives
+# Uploaded images get thumbnail/medium/full copies (plus WebP) generated by a
+# background job, so the admin save returns as soon as the file is stored.
+IMAGE_MODELS = {
+    # model -> (upload field, variants field, page cache tag)
+    Article: ('image_path', 'image_variants', 'article'),
+    News: ('media_path', 'media_variants', 'news'),
+    Moment: ('media_path', 'media_variants', 'moment'),
+}
+
+@job_handler('build_image_derivatives')
+def build_image_derivatives(model_name, model_id):
+    """Generate the copies of one model's image and store their description"""
+    model_class = next(model_class for model_class in IMAGE_MODELS if model_class.__name__ == model_name)
+    path_field, variants_field, tag = IMAGE_MODELS[model_class]
+    
+    model = db.session.get(model_class, model_id)
+    filename = getattr(model, path_field) if model else None
+    if not filename:
+        return
+    
+    try:
+        description = generate_derivatives(app.config['UPLOAD_FOLDER'], filename)
+    except OSError as e:
+        # Missing or unreadable file: record that there are no copies instead of retrying
+        print(f"Error generating image derivatives for {filename}: {e}")
+        description = {}
+    
+    # Skip the update if the image was replaced while we were working
+    db.session.execute(
+        model_class.__table__.update()
+        .where(model_class.id == model_id, getattr(model_class, path_field) == filename)
+        .values({variants_field: json.dumps(description)})
+    )
+    db.session.commit()
+    
+    invalidate_pages(tag, f'{tag}:{model_id}')
+
+def queue_image_derivatives(model):
+    """Generate the image copies of a saved model in a background job"""
+    enqueue_job('build_image_derivatives', model_name=type(model).__name__, model_id=model.id)
+    db.session.commit()
+
+@app.cli.command('generate-image-derivatives')
+def generate_image_derivatives_command():
+    """Generate the image copies for uploads that don't have them yet"""
+    for model_class, (path_field, variants_field, _) in IMAGE_MODELS.items():
+        pending = model_class.query.filter(
+            model_class.media_type == 'image',
+            getattr(model_class, path_field).isnot(None),
+            getattr(model_class, variants_field).is_(None)
+        ).all()
+        for model in pending:
+            build_image_derivatives(model_class.__name__, model.id)
+            print(f"🖼️ Generated image derivatives for {model_class.__name__} {model.id}")
+    
+    print("🎯 Image derivatives are up to date")
+
+# Template helpers for responsive images
+def upload_url(filename):
+    return url_for('static', filename='uploads/' + filename)
+
+@app.template_global()
+def image_url(filename, variants=None, size='medium'):
+    """URL of the named copy of an upload, or of the original while the copies don't exist"""
+    for variant in load_description(variants).get('variants', []):
+        if variant['name'] == size:
+            return upload_url(variant['file'])
+    return upload_url(filename)
+
+@app.template_global()
+def image_srcset(variants, webp=False):
+    """srcset value listing every copy of an upload with its width"""
+    return ', '.join(
+        f"{upload_url(variant['webp'] if webp else variant['file'])} {variant['width']}w"
+        for variant in load_description(variants).get('variants', [])
+    )
+
+@app.template_global()
+def webp_source(variants, sizes):
+    """<source> offering the WebP copies inside a <picture>; empty until they exist"""
+    srcset = image_srcset(variants, webp=True)
+    if not srcset:
+        return ''
+    return Markup(f'<source type="image/webp" srcset="{escape(srcset)}" sizes="{escape(sizes)}">')
+
+# Static assets
+# `flask build-assets` writes content-hashed (and gzip/brotli) copies of the
+# files in static/; url_for('static', ...) picks the hashed names up from the
+# manifest, and those - like the uuid-named uploads - are served as immutable.
+ASSET_MAX_AGE = 365 * 24 * 60 * 60  # seconds
+asset_manifest = load_manifest(app.static_folder)
+fingerprinted_assets = set(asset_manifest.values())
+ASSETS_VERSION = hashlib.sha1(json.dumps(asset_manifest, sort_keys=True).encode('utf-8')).hexdigest()
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """Point url_for('static', filename=...) at the fingerprinted copy when one was built"""
+    if endpoint == 'static' and values.get('filename') in asset_manifest:
+        values['filename'] = asset_manifest[values['filename']]
+
+def serve_static(filename):
+    """Static view: files whose name never points at other content are cached for a year, precompressed when possible"""
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)  # Unfinished chunked uploads
+    if filename not in fingerprinted_assets and not is_unique_upload(filename):
+        return app.send_static_file(filename)
+    
+    compressed = [
+        (encoding, suffix) for encoding, suffix in ENCODINGS
+        if os.path.isfile(os.path.join(app.static_folder, filename + suffix))
+    ]
+    encoding, suffix = next(
+        ((encoding, suffix) for encoding, suffix in compressed if request.accept_encodings[encoding]),
+        (None, '')
+    )
+    
+    response = send_from_directory(
+        app.static_folder, filename + suffix,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        max_age=ASSET_MAX_AGE
+    )
+    if encoding:
+        response.content_encoding = encoding
+    if compressed:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+app.view_functions['static'] = serve_static
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress the files in static/ (restart the app afterwards)"""
+    manifest = build_assets(app.static_folder)
+    print(f"📦 Fingerprinted {len(manifest)} static files")
+    print("🎯 Static assets are up to date")
+
+# Chunked uploads
+# The admin forms send media in chunks of UPLOAD_CHUNK_SIZE to these endpoints
+# (streamed to disk, resumable from the reported offset, each chunk checked
+# against its X-Chunk-SHA256) and submit only the upload id with the form.
+IMAGE_EXTENSIONS = ['jpg', 'png', 'gif', 'jpeg']
+VIDEO_EXTENSIONS = ['mp4', 'avi', 'mov']
+chunked_uploads = ChunkedUploads(
+    app.config['UPLOAD_FOLDER'],
+    max_size=app.config['MAX_UPLOAD_SIZE'],
+    allowed_extensions=IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
+)
+
+def upload_api(f):
+    """Admin-only JSON endpoint; UploadError becomes an error response carrying the current offset"""
+    @wraps(f)
+    @login_required
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_admin:
+            abort(403)
+        try:
+            return f(*args, **kwargs)
+        except UploadError as e:
+            return jsonify({'error': str(e), 'offset': e.offset}), e.status
+    return decorated_function
+
+@app.route('/admin/uploads', methods=['POST'])
+@upload_api
+def create_chunked_upload():
+    data = request.get_json(silent=True) or {}
+    status = chunked_uploads.create(data.get('filename'), data.get('size'), data.get('sha256'))
+    status['chunk_size'] = app.config['UPLOAD_CHUNK_SIZE']
+    return jsonify(status), 201
+
+@app.route('/admin/uploads/<upload_id>', methods=['GET'])
+@upload_api
+def chunked_upload_status(upload_id):
+    status = chunked_uploads.status(upload_id)
+    status['chunk_size'] = app.config['UPLOAD_CHUNK_SIZE']
+    return jsonify(status)
+
+@app.route('/admin/uploads/<upload_id>', methods=['PATCH'])
+@upload_api
+def upload_chunk(upload_id):
+    """Body: the raw chunk. Headers: Upload-Offset (where it starts) and optionally X-Chunk-SHA256"""
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        raise UploadError('Missing Upload-Offset header')
+    
+    status = chunked_uploads.write_chunk(
+        upload_id, offset, request.stream, request.content_length,
+        sha256=request.headers.get('X-Chunk-SHA256')
+    )
+    return jsonify(status)
+
+@app.route('/admin/uploads/<upload_id>', methods=['DELETE'])
+@upload_api
+def discard_chunked_upload(upload_id):
+    chunked_uploads.discard(upload_id)
+    return '', 204
+
+def save_admin_upload(file, upload_id=None, extensions=None):
+    """Store the file of an admin form (a finished chunked upload or a plain file field); returns the stored filename"""
+    if upload_id:
+        try:
+            filename = chunked_uploads.status(upload_id)['filename']
+            if extensions and filename.rsplit('.', 1)[-1].lower() not in extensions:
+                raise ValidationError('File type not allowed')
+            return chunked_uploads.finish(upload_id)
+        except UploadError as e:
+            raise ValidationError(f'Upload failed: {e}')
+    if file:
+        unique_filename = f"{uuid.uuid4().hex}_{secure_filename(file.filename)}"
+        file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
+        return unique_filename
+    return None
+
 # Admin Views
-class ArticleAdmin(ModelView):
+class PublicContentAdmin(ModelView):
+    """Admin view for content shown on the public pages; saving or deleting drops the cached pages that show it"""
+    page_cache_tag = None
+    
+    def invalidate_cached_pages(self, model):
+        invalidate_pages(self.page_cache_tag, f'{self.page_cache_tag}:{model.id}')
+    
+    def after_model_change(self, form, model, is_created):
+        self.invalidate_cached_pages(model)
+        # New uploads had their variants cleared in on_model_change
+        if type(model) in IMAGE_MODELS:
+            path_field, variants_field, _ = IMAGE_MODELS[type(model)]
+            if model.media_type == 'image' and getattr(model, path_field) and getattr(model, variants_field) is None:
+                queue_image_derivatives(model)
+    
+    def after_model_delete(self, model):
+        self.invalidate_cached_pages(model)
+
+class ArticleAdmin(PublicContentAdmin):
+    page_cache_tag = 'article'
+    
     form_extra_fields = {
-        'image': FileField('Image', validators=[FileAllowed(['jpg', 'png', 'gif', 'jpeg'])])
+        'image': FileField('Image', validators=[FileAllowed(IMAGE_EXTENSIONS)]),
+        'image_upload': HiddenField()
     }
+    form_widget_args = {'image': {'data-chunked-upload': 'image_upload'}}
+    create_template = 'admin/model/chunked_upload_create.html'
+    edit_template = 'admin/model/chunked_upload_edit.html'
     
     # Hide the image_path and media_type fields from the form
-    form_excluded_columns = ['image_path', 'media_type']
+    form_excluded_columns = ['image_path', 'media_type', 'image_variants', 'updated_at']
     
     def on_model_change(self, form, model, is_created):
-        if form.image.data:
-            file = form.image.data
-            filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
+        unique_filename = save_admin_upload(form.image.data, form.image_upload.data, IMAGE_EXTENSIONS)
+        if unique_filename:
             model.image_path = unique_filename
             model.media_type = 'image'
+            model.image_variants = None  # Regenerated in the background after the save
 
-class NewsAdmin(ModelView):
+class NewsAdmin(PublicContentAdmin):
+    page_cache_tag = 'news'
+    
     form_extra_fields = {
-        'media': FileField('Media', validators=[FileAllowed(['jpg', 'png', 'gif', 'jpeg', 'mp4', 'avi', 'mov'])])
+        'media': FileField('Media', validators=[FileAllowed(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS)]),
+        'media_upload': HiddenField()
     }
+    form_widget_args = {'media': {'data-chunked-upload': 'media_upload'}}
+    create_template = 'admin/model/chunked_upload_create.html'
+    edit_template = 'admin/model/chunked_upload_edit.html'
     
     # Hide the media_path and media_type fields from the form
-    form_excluded_columns = ['media_path', 'media_type']
+    form_excluded_columns = ['media_path', 'media_type', 'media_variants', 'updated_at']
     
     def on_model_change(self, form, model, is_created):
-        if form.media.data:
-            file = form.media.data
-            filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
+        unique_filename = save_admin_upload(form.media.data, form.media_upload.data)
+        if unique_filename:
             model.media_path = unique_filename
+            model.media_variants = None  # Regenerated in the background after the save
             
             # Determine media type
-            if filename.lower().endswith(('.mp4', '.avi', '.mov')):
+            if unique_filename.lower().endswith(tuple('.' + extension for extension in VIDEO_EXTENSIONS)):
                 model.media_type = 'video'
             else:
                 model.media_type = 'image'
 
-class MomentAdmin(ModelView):
+class MomentAdmin(PublicContentAdmin):
+    page_cache_tag = 'moment'
+    
     form_extra_fields = {
-        'media': FileField('Media', validators=[FileAllowed(['jpg', 'png', 'gif', 'jpeg', 'mp4', 'avi', 'mov'])])
+        'media': FileField('Media', validators=[FileAllowed(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS)]),
+        'media_upload': HiddenField()
     }
+    form_widget_args = {'media': {'data-chunked-upload': 'media_upload'}}
+    create_template = 'admin/model/chunked_upload_create.html'
+    edit_template = 'admin/model/chunked_upload_edit.html'
     
     form_choices = {
         'category': [
@@ -216,19 +1280,16 @@ class MomentAdmin(ModelView):
     }
     
     # Hide the media_path and media_type fields from the form
-    form_excluded_columns = ['media_path', 'media_type']
+    form_excluded_columns = ['media_path', 'media_type', 'media_variants', 'updated_at']
     
     def on_model_change(self, form, model, is_created):
-        if form.media.data:
-            file = form.media.data
-            filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
+        unique_filename = save_admin_upload(form.media.data, form.media_upload.data)
+        if unique_filename:
             model.media_path = unique_filename
+            model.media_variants = None  # Regenerated in the background after the save
             
             # Determine media type
-            if filename.lower().endswith(('.mp4', '.avi', '.mov')):
+            if unique_filename.lower().endswith(tuple('.' + extension for extension in VIDEO_EXTENSIONS)):
                 model.media_type = 'video'
             else:
                 model.media_type = 'image'
@@ -239,17 +1300,29 @@ admin.add_view(NewsAdmin(News, db.session))
 admin.add_view(MomentAdmin(Moment, db.session))
 
 # Announcement Admin
-class AnnouncementAdmin(ModelView):
-    column_list = ['id', 'title', 'category', 'priority', 'is_published', 'created_at', 'sent_to_newsletter']
+def format_delivery_progress(view, context, model, name):
+    """Delivery progress of an announcement, e.g. 120/300 (40%) · 2 αποτυχίες"""
+    if model.recipients_target is None:
+        return '—'
+    
+    percent = int(model.delivered_count * 100 / model.recipients_target) if model.recipients_target else 100
+    progress = f"{model.delivered_count}/{model.recipients_target} ({min(percent, 100)}%)"
+    if model.failed_count:
+        progress += f" · {model.failed_count} αποτυχίες"
+    return progress
+
+class AnnouncementAdmin(PublicContentAdmin):
+    page_cache_tag = 'announcement'
+    
+    column_list = ['id', 'title', 'category', 'priority', 'is_published', 'created_at', 'sent_to_newsletter', 'delivery_progress']
+    column_labels = {'delivery_progress': 'Πρόοδος αποστολής'}
+    column_formatters = {'delivery_progress': format_delivery_progress}
+    form_excluded_columns = ['recipients_target', 'sent_count', 'failed_count', 'sending_since', 'sent_emails', 'updated_at']
     column_searchable_list = ['title', 'content', 'category']
     column_filters = ['category', 'priority', 'is_published', 'sent_to_newsletter', 'created_at']
+    
     form_choices = {
-        'category': [
-            ('general', 'Γενική ανακοίνωση'),
-            ('event', 'Εκδήλωση'),
-            ('important', 'Σημαντική ανακοίνωση'),
-            ('news', 'Νέα')
-        ],
+        'category': list(Announcement.CATEGORY_LABELS.items()),
         'priority': [
             ('low', 'Χαμηλή'),
             ('normal', 'Κανονική'),
@@ -258,10 +1331,32 @@ class AnnouncementAdmin(ModelView):
         ]
     }
     
+    def _apply_search(self, query, count_query, joins, count_joins, search):
+        """Search title and content through the full-text index instead of LIKE scans"""
+        criteria = [Announcement.category == search.strip()]
+        terms = query_terms(search)
+        if terms:
+            matching_ids = search_query(terms, ['announcement'], public_only=False) \
+                .order_by(None).with_entities(SearchDocument.object_id).subquery()
+            criteria.append(Announcement.id.in_(select(matching_ids.c.object_id)))
+        criterion = or_(*criteria)
+        if count_query is not None:
+            count_query = count_query.filter(criterion)
+        return query.filter(criterion), count_query, joins, count_joins
+    
     def on_model_change(self, form, model, is_created):
         # Don't send automatically - let the local script handle it
         # The local script will check for unsent announcements and send them
         pass
+    
+    @action('send_newsletter', 'Αποστολή στο newsletter',
+            'Να σταλούν οι επιλεγμένες ανακοινώσεις στους συνδρομητές από τον server;')
+    def action_send_newsletter(self, ids):
+        """Send the selected announcements from the site itself, in background jobs"""
+        for announcement_id in ids:
+            enqueue_job('send_announcement', max_attempts=3, announcement_id=int(announcement_id))
+        db.session.commit()
+        flash(f'{len(ids)} announcements queued for sending', 'success')
 
 # Admin Actions
 class AdminActions(ModelView):
@@ -286,21 +1381,57 @@ def admin_send_contact_notifications():
         abort(403)
     
     try:
-        send_contact_notifications()
-        flash('Contact notifications sent successfully!', 'success')
+        queued = send_contact_notifications()
+        flash(f'{queued} contact notifications queued for sending', 'success')
     except Exception as e:
-        flash(f'Error sending contact notifications: {e}', 'error')
+        db.session.rollback()
+        flash(f'Error queueing contact notifications: {e}', 'error')
     
     return redirect(url_for('admin.index'))
 
 # Newsletter Subscribers Admin
 class NewsletterSubscriberAdmin(ModelView):
-    column_list = ['id', 'email', 'subscribed_at', 'is_active', 'welcome_email_sent']
+    column_list = ['id', 'email', 'subscribed_at', 'is_active', 'welcome_email_sent', 'categories']
+    column_descriptions = {'categories': 'Comma-separated announcement categories (general, event, news); empty = all'}
     column_searchable_list = ['email']
     column_filters = ['is_active', 'welcome_email_sent', 'subscribed_at']
     can_create = False  # Users can only subscribe through the form
     can_delete = True
     can_edit = True
+    list_template = 'admin/model/subscriber_list.html'
+    
+    def on_model_change(self, form, model, is_created):
+        if model.categories is not None:
+            wanted = {category.strip() for category in model.categories.split(',')}
+            model.categories = ','.join(category for category, _ in newsletter_categories() if category in wanted)
+    
+    @expose('/import/', methods=['GET', 'POST'])
+    def import_view(self):
+        """Upload a CSV or NDJSON list of subscribers"""
+        if not current_user.is_authenticated or not current_user.is_admin:
+            abort(403)
+        
+        stats = None
+        upload = request.files.get('file')
+        if request.method == 'POST' and upload and upload.filename:
+            try:
+                # Werkzeug spools large uploads to a temporary file, so this streams from disk
+                stats = import_subscribers(upload.stream, format_for(upload.filename),
+                                           send_welcome=bool(request.form.get('send_welcome')))
+                flash(f"{stats['added']} new subscribers imported, {stats['invalid']} invalid rows skipped", 'success')
+            except Exception as e:
+                flash(f'Error importing subscribers: {e}', 'error')
+        
+        return self.render('admin/subscriber_import.html', stats=stats)
+    
+    @expose('/export/<file_format>')
+    def export_view(self, file_format):
+        """Download every subscriber as CSV or NDJSON"""
+        if not current_user.is_authenticated or not current_user.is_admin:
+            abort(403)
+        if file_format not in FORMATS:
+            abort(404)
+        return export_subscribers_response(file_format)
     
 admin.add_view(NewsletterSubscriberAdmin(NewsletterSubscriber, db.session, name='Newsletter Subscribers'))
 
@@ -309,18 +1440,189 @@ class ContactMessageAdmin(ModelView):
     column_list = ['id', 'first_name', 'last_name', 'email', 'subject', 'created_at', 'notification_sent']
     column_searchable_list = ['email', 'first_name', 'last_name', 'subject']
     column_filters = ['notification_sent', 'created_at']
+    form_excluded_columns = ['notification_sending_since']
     can_create = False  # Users can only send through the form
     can_delete = True
     can_edit = True
     
 admin.add_view(ContactMessageAdmin(ContactMessage, db.session, name='Contact Messages'))
 
+# Background Jobs Admin
+class JobAdmin(ModelView):
+    column_list = ['id', 'kind', 'status', 'attempts', 'max_attempts', 'run_after', 'updated_at', 'last_error']
+    column_filters = ['kind', 'status', 'created_at']
+    column_default_sort = ('id', True)
+    can_create = False  # Jobs are queued by the site itself
+    can_edit = False
+    can_delete = True
+    can_view_details = True
+    
+    @action('retry', 'Επανάληψη', 'Να ξαναμπούν στην ουρά οι επιλεγμένες εργασίες;')
+    def action_retry(self, ids):
+        """Queue failed jobs again with a fresh set of attempts"""
+        jobs = Job.query.filter(Job.id.in_([int(job_id) for job_id in ids]), Job.status == 'failed').all()
+        for job in jobs:
+            job.status = 'queued'
+            job.attempts = 0
+            job.run_after = datetime.utcnow()
+        db.session.commit()
+        flash(f'{len(jobs)} jobs queued again', 'success')
+
+admin.add_view(JobAdmin(Job, db.session, name='Background Jobs'))
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+# Page cache for the public routes
+def invalidate_pages(*tags):
+    """Drop the cached pages and content versions carrying any of the tags, in this worker"""
+    version_cache.invalidate(*tags)
+    return page_cache.invalidate(*tags)
+
+def cached_page(*tags):
+    """Serve the view from page_cache for anonymous visitors without pending flash messages
+    
+    Entries are keyed by path and query string. Tags may use the view
+    arguments, e.g. 'news:{news_id}', and are invalidated by the admin views.
+    An entry is only served while the content versions of its tags' tables
+    are unchanged, so edits made through other workers show up as well.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not page_cache.enabled or current_user.is_authenticated or session.get('_flashes'):
+                return f(*args, **kwargs)
+            
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            stamp = content_stamp(tags)
+            cached = page_cache.get(key)
+            if cached is not None and cached[0] == stamp:
+                _, body, content_type = cached
+                return app.response_class(body, content_type=content_type)
+            
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and 'Set-Cookie' not in response.headers:
+                page_cache.set(key, (stamp, response.get_data(), response.content_type),
+                               [tag.format(**kwargs) for tag in tags])
+            return response
+        return decorated_function
+    return decorator
+
+# Conditional GET for the public routes
+# Pages carry an ETag built from the version of the content they show, so a
+# client or proxy that already holds the current version gets a 304 without
+# the page being rendered. Versions are kept in version_cache under the same
+# tags as the pages, so a commit drops them at once in its own worker and a
+# hit costs no query; other workers re-read them after CONTENT_VERSION_TTL.
+# The same versions stamp the cached pages and facets (content_stamp).
+CONTENT_MODELS = {'article': Article, 'news': News, 'moment': Moment, 'announcement': Announcement}
+TEMPLATES_VERSION = str(max(
+    (os.path.getmtime(os.path.join(root, name)) for root, _, names in os.walk(app.template_folder) for name in names),
+    default=0
+))
+
+def content_version(spec):
+    """(version, last modified) of the content behind a tag like 'news' or 'news:5'
+    
+    A row is versioned by its updated_at; a whole table by its row count and
+    newest updated_at, so deletes change the version as well. Returns None
+    for a row that doesn't exist.
+    """
+    name, _, model_id = spec.partition(':')
+    model = CONTENT_MODELS[name]
+    
+    if model_id:
+        last_modified = db.session.query(func.coalesce(model.updated_at, model.created_at)).filter(
+            model.id == int(model_id)).first()
+        if last_modified is None:
+            return None
+        last_modified = last_modified[0]
+        return f"{spec}@{last_modified.isoformat() if last_modified else ''}", last_modified
+    
+    count, last_modified = db.session.query(func.count(model.id), func.max(model.updated_at)).one()
+    return f"{spec}#{count}@{last_modified.isoformat() if last_modified else ''}", last_modified
+
+def cached_content_version(spec):
+    """content_version(spec), remembered for CONTENT_VERSION_TTL or until the spec's tag is invalidated"""
+    cached = version_cache.get(spec)
+    if cached is None:
+        cached = (content_version(spec),)  # Wrapped, so a missing row (None) is cached too
+        version_cache.set(spec, cached, [spec])
+    return cached[0]
+
+def content_stamp(tags):
+    """The versions of the tables behind cache tags like 'news' or 'news:{news_id}'
+    
+    Read from the database, so every worker agrees on them; an entry stored
+    with an older stamp is stale whichever worker handled the edit.
+    """
+    return tuple(cached_content_version(name)[0] for name in sorted({tag.partition(':')[0] for tag in tags}))
+
+@event.listens_for(Session, 'after_flush')
+def track_content_changes(session, flush_context):
+    changed = {
+        tag for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+        for name, model in CONTENT_MODELS.items() if isinstance(obj, model)
+        for tag in (name, f'{name}:{obj.id}')
+    }
+    if changed:
+        session.info.setdefault('content_changes', set()).update(changed)
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_changed_content(session):
+    changed = session.info.pop('content_changes', None)
+    if changed:
+        invalidate_pages(*changed)
+
+@event.listens_for(Session, 'after_rollback')
+def discard_content_changes(session):
+    session.info.pop('content_changes', None)
+
+def conditional_page(*specs):
+    """Answer conditional GETs for a view with 304 while the content it shows is unchanged
+    
+    specs name the content like cached_page tags ('news', 'news:{news_id}').
+    If-Modified-Since is only trusted for single rows: a table's newest
+    updated_at doesn't move when a row is deleted, its ETag does.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if session.get('_flashes'):
+                return f(*args, **kwargs)
+            
+            versions = [cached_content_version(spec.format(**kwargs)) for spec in specs]
+            if None in versions:
+                return f(*args, **kwargs)  # Let the view answer 404
+            
+            user = current_user.get_id() if current_user.is_authenticated else 'anonymous'
+            etag = hashlib.sha1('|'.join(
+                [request.full_path, user, TEMPLATES_VERSION, ASSETS_VERSION] + [version for version, _ in versions]
+            ).encode('utf-8')).hexdigest()
+            
+            modified = [last_modified for _, last_modified in versions if last_modified]
+            last_modified = max(modified).replace(microsecond=0) if len(modified) == len(versions) else None
+            
+            not_modified = request.if_none_match.contains_weak(etag)
+            if not request.if_none_match and last_modified and all(':' in spec for spec in specs):
+                not_modified = bool(request.if_modified_since) and \
+                    request.if_modified_since.replace(tzinfo=None) >= last_modified
+            
+            response = app.response_class(status=304) if not_modified else make_response(f(*args, **kwargs))
+            if response.status_code in (200, 304):
+                response.set_etag(etag, weak=True)
+                if last_modified:
+                    response.last_modified = last_modified
+                response.cache_control.no_cache = True
+            return response
+        return decorated_function
+    return decorator
+
 # Routes
 @app.route('/')
+@conditional_page('article', 'news')
+@cached_page('article', 'news')
 def index():
     articles = Article.query.order_by(Article.created_at.desc()).limit(3).all()
     news = News.query.order_by(News.created_at.desc()).limit(3).all()
@@ -345,32 +1647,20 @@ def contact():
             flash('Παρακαλώ συμπληρώστε όλα τα πεδία!', 'error')
             return redirect(url_for('contact'))
         
-        # Save contact message
-        contact_msg = ContactMessage(
-            first_name=first_name,
-            last_name=last_name,
-            email=email,
-            subject=subject,
-            message=message
-        )
-        db.session.add(contact_msg)
-        db.session.commit()
-        
-        # Try to send email notification
-        try:
-            if save_contact_message(first_name, last_name, email, subject, message):
-                flash('Το μήνυμά σας στάλθηκε επιτυχώς! Θα σας απαντήσουμε σύντομα.', 'success')
-            else:
-                flash('Το μήνυμά σας αποθηκεύθηκε αλλά η αποστολή email απέτυχε. Θα σας απαντήσουμε σύντομα.', 'warning')
-        except Exception as e:
-            print(f"Error sending contact email: {e}")
-            flash('Το μήνυμά σας αποθηκεύθηκε αλλά η αποστολή email απέτυχε. Θα σας απαντήσουμε σύντομα.', 'warning')
+        # Save contact message; the notification email goes out in a background job
+        contact_msg = save_contact_message(first_name, last_name, email, subject, message)
+        if contact_msg:
+            flash('Το μήνυμά σας στάλθηκε επιτυχώς! Θα σας απαντήσουμε σύντομα.', 'success')
+        else:
+            flash('Παρουσιάστηκε σφάλμα κατά την αποστολή του μηνύματος. Παρακαλώ δοκιμάστε ξανά.', 'error')
         
         return redirect(url_for('contact'))
     
     return render_template('contact.html')
 
 @app.route('/news')
+@conditional_page('news')
+@cached_page('news')
 def news():
     page = request.args.get('page', 1, type=int)
     news_items = News.query.order_by(News.created_at.desc()).paginate(
@@ -378,6 +1668,8 @@ def news():
     return render_template('news.html', news_items=news_items)
 
 @app.route('/announcements')
+@conditional_page('announcement')
+@cached_page('announcement')
 def announcements():
     page = request.args.get('page', 1, type=int)
     category_filter = request.args.get('category', '')
@@ -393,26 +1685,26 @@ def announcements():
     announcements_list = query.order_by(Announcement.created_at.desc()).paginate(
         page=page, per_page=10, error_out=False)
     
-    # Get unique categories and priorities for filters
-    categories = db.session.query(Announcement.category).distinct().all()
-    categories = [cat[0] for cat in categories]
-    
-    priorities = db.session.query(Announcement.priority).distinct().all()
-    priorities = [pri[0] for pri in priorities]
+    # Categories and priorities (with counts) for the filters
+    facets = get_announcement_facets()
     
     return render_template('announcements.html', 
                          announcements=announcements_list,
-                         categories=categories,
-                         priorities=priorities,
+                         categories=facets['category'],
+                         priorities=facets['priority'],
                          current_category=category_filter,
                          current_priority=priority_filter)
 
 @app.route('/news/<int:news_id>')
+@conditional_page('news:{news_id}')
+@cached_page('news:{news_id}')
 def news_detail(news_id):
     news_item = News.query.get_or_404(news_id)
     return render_template('news_detail.html', news=news_item)
 
 @app.route('/articles')
+@conditional_page('article')
+@cached_page('article')
 def articles():
     page = request.args.get('page', 1, type=int)
     articles_list = Article.query.order_by(Article.created_at.desc()).paginate(
@@ -420,40 +1712,159 @@ def articles():
     return render_template('articles.html', articles=articles_list)
 
 @app.route('/articles/<int:article_id>')
+@conditional_page('article:{article_id}')
+@cached_page('article:{article_id}')
 def article_detail(article_id):
     article = Article.query.get_or_404(article_id)
     return render_template('article_detail.html', article=article)
 
 @app.route('/category/<category>')
+@conditional_page('article')
+@cached_page('article')
 def category(category):
     page = request.args.get('page', 1, type=int)
     articles_list = Article.query.filter_by(category=category).order_by(
         Article.created_at.desc()).paginate(page=page, per_page=6, error_out=False)
     return render_template('category.html', articles=articles_list, category=category)
 
-@app.route('/moments')
-def moments():
-    category_filter = request.args.get('category', '')
-    sort_by = request.args.get('sort', 'newest')
+def search_args():
+    """Query, kinds, page and page size of a search request"""
+    query = request.args.get('q', '').strip()
+    kinds = [kind for kind in request.args.getlist('kind') if kind in SEARCH_KINDS]
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(max(1, request.args.get('per_page', SEARCH_PAGE_SIZE, type=int)), SEARCH_MAX_PAGE_SIZE)
+    return query, kinds, page, per_page
+
+@app.route('/search')
+def search():
+    query, kinds, page, per_page = search_args()
+    results, total = search_content(query, kinds, page, per_page)
+    return render_template('search.html', query=query, kinds=kinds, results=results, total=total,
+                           page=page, pages=(total + per_page - 1) // per_page, search_kinds=SEARCH_KINDS)
+
+@app.route('/api/search')
+def api_search():
+    """Ranked search results as JSON (?q=...&kind=news&page=2&per_page=10)"""
+    query, kinds, page, per_page = search_args()
+    results, total = search_content(query, kinds, page, per_page)
+    return jsonify({
+        'query': query,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page,
+        'results': results
+    })
+
+# Moments gallery, paginated by keyset so each page costs the same however big the gallery grows
+MOMENTS_PAGE_SIZE = 12
+MOMENTS_MAX_PAGE_SIZE = 48
+MOMENT_SORTS = {
+    # sort -> (column, descending)
+    'newest': (Moment.created_at, True),
+    'oldest': (Moment.created_at, False),
+    'title': (Moment.title, False),
+}
+
+def encode_moments_cursor(moment, sort_by):
+    """Opaque cursor pointing just past moment in the given sort order"""
+    value = moment.title if sort_by == 'title' else moment.created_at
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, moment.id]).encode('utf-8')).decode('ascii')
+
+def decode_moments_cursor(cursor, sort_by):
+    """Inverse of encode_moments_cursor; returns None for a missing or malformed cursor"""
+    try:
+        value, moment_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if sort_by != 'title' and value is not None:
+            value = datetime.fromisoformat(value)
+        return value, int(moment_id)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+def get_moments_page(category_filter='', sort_by='newest', cursor=None, limit=MOMENTS_PAGE_SIZE):
+    """One page of moments plus the cursor of the next page (None on the last page)
     
+    Rows without a value in the sort column come last in either direction.
+    """
+    column, descending = MOMENT_SORTS.get(sort_by, MOMENT_SORTS['newest'])
     query = Moment.query
     
     if category_filter:
         query = query.filter_by(category=category_filter)
     
-    if sort_by == 'oldest':
-        query = query.order_by(Moment.created_at.asc())
-    else:  # newest
-        query = query.order_by(Moment.created_at.desc())
+    position = decode_moments_cursor(cursor, sort_by) if cursor else None
+    if position:
+        value, moment_id = position
+        after_id = Moment.id < moment_id if descending else Moment.id > moment_id
+        if value is None:
+            query = query.filter(column.is_(None), after_id)
+        else:
+            after_value = column < value if descending else column > value
+            query = query.filter(or_(after_value, and_(column == value, after_id), column.is_(None)))
+    
+    if descending:
+        query = query.order_by(column.desc().nulls_last(), Moment.id.desc())
+    else:
+        query = query.order_by(column.asc().nulls_last(), Moment.id.asc())
     
-    moments_list = query.all()
+    moments_list = query.limit(limit + 1).all()
+    next_cursor = encode_moments_cursor(moments_list[limit - 1], sort_by) if len(moments_list) > limit else None
+    return moments_list[:limit], next_cursor
+
+@app.route('/moments')
+@conditional_page('moment')
+@cached_page('moment')
+def moments():
+    category_filter = request.args.get('category', '')
+    sort_by = request.args.get('sort', 'newest')
+    if sort_by not in MOMENT_SORTS:
+        sort_by = 'newest'
     
-    # Get unique categories for filter
-    categories = db.session.query(Moment.category).distinct().all()
-    categories = [cat[0] for cat in categories]
+    moments_list, next_cursor = get_moments_page(category_filter, sort_by, request.args.get('cursor'))
+    
+    # Categories (with counts) for the filter
+    categories = get_moment_facets()['category']
     
     return render_template('moments.html', moments=moments_list, categories=categories, 
-                         current_category=category_filter, current_sort=sort_by)
+                         category_labels=Moment.CATEGORY_LABELS,
+                         current_category=category_filter, current_sort=sort_by,
+                         next_cursor=next_cursor)
+
+@app.route('/api/moments')
+@conditional_page('moment')
+@cached_page('moment')
+def api_moments():
+    """Next page of the moments gallery for infinite scrolling"""
+    category_filter = request.args.get('category', '')
+    sort_by = request.args.get('sort', 'newest')
+    if sort_by not in MOMENT_SORTS:
+        sort_by = 'newest'
+    limit = min(max(request.args.get('limit', MOMENTS_PAGE_SIZE, type=int), 1), MOMENTS_MAX_PAGE_SIZE)
+    
+    moments_list, next_cursor = get_moments_page(category_filter, sort_by, request.args.get('cursor'), limit)
+    
+    return jsonify({
+        'items': [
+            {
+                'id': moment.id,
+                'title': moment.title,
+                'description': moment.description,
+                'category': moment.category,
+                'category_display': moment.category_display,
+                'media_url': url_for('static', filename='uploads/' + moment.media_path),
+                'media_type': moment.media_type,
+                'image_url': image_url(moment.media_path, moment.media_variants, 'medium'),
+                'full_url': image_url(moment.media_path, moment.media_variants, 'full'),
+                'srcset': image_srcset(moment.media_variants),
+                'webp_srcset': image_srcset(moment.media_variants, webp=True),
+                'created_at': moment.created_at.strftime('%d/%m/%Y') if moment.created_at else None
+            }
+            for moment in moments_list
+        ],
+        'next_cursor': next_cursor
+    })
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -489,7 +1900,8 @@ def subscribe_newsletter():
         return redirect(url_for('index'))
     
     # Save subscriber using the new function
-    success, message = save_newsletter_subscriber(email)
+    categories = request.form.getlist('categories') if request.form.get('preferences') else None
+    success, message = save_newsletter_subscriber(email, categories)
     
     if success:
         flash('Επιτυχής εγγραφή στο newsletter!', 'success')
@@ -499,7 +1911,7 @@ def subscribe_newsletter():
     return redirect(url_for('index'))
 
 def save_contact_message(first_name, last_name, email, subject, message):
-    """Save contact form message to database"""
+    """Save contact form message to database and queue its notification; returns the message or None"""
     try:
         contact_msg = ContactMessage(
             first_name=first_name,
@@ -510,16 +1922,25 @@ def save_contact_message(first_name, last_name, email, subject, message):
             notification_sent=False
         )
         db.session.add(contact_msg)
+        db.session.flush()
+        enqueue_job('send_contact_notification', contact_id=contact_msg.id)
         db.session.commit()
         print(f"Contact message saved successfully from {email}")
-        return True
+        return contact_msg
     except Exception as e:
         print(f"Error saving contact message: {e}")
         db.session.rollback()
-        return False
+        return None
 
-def save_newsletter_subscriber(email):
-    """Save newsletter subscriber to database"""
+def save_newsletter_subscriber(email, categories=None):
+    """Save newsletter subscriber to database
+    
+    categories are the announcement categories to receive (None = all); they
+    only apply to new or reactivated subscriptions.
+    """
+    wanted = [category for category, _ in newsletter_categories() if category in (categories or ())]
+    categories = ','.join(wanted) if categories is not None and len(wanted) < len(newsletter_categories()) else None
+    
     try:
         # Check if email already exists
         existing = NewsletterSubscriber.query.filter_by(email=email).first()
@@ -529,12 +1950,13 @@ def save_newsletter_subscriber(email):
                 return False, "Email already subscribed"
             else:
                 existing.is_active = True
+                existing.categories = categories
                 db.session.commit()
                 print(f"Email {email} reactivated")
                 return True, "Email reactivated"
         
         # Create new subscriber
-        subscriber = NewsletterSubscriber(email=email, welcome_email_sent=False)
+        subscriber = NewsletterSubscriber(email=email, welcome_email_sent=False, categories=categories)
         db.session.add(subscriber)
         db.session.commit()
         print(f"Newsletter subscriber saved successfully: {email}")
@@ -544,16 +1966,180 @@ def save_newsletter_subscriber(email):
         db.session.rollback()
         return False, f"Error: {e}"
 
+# Bulk subscriber import/export
+# Imports stream the file through subscriber_io and write each batch with a
+# single INSERT ... ON CONFLICT executemany; exports page through the table
+# by id and stream the lines out, so neither holds the whole list in memory.
+SUBSCRIBER_IMPORT_BATCH = 5000
+SUBSCRIBER_EXPORT_BATCH = 5000
+MAX_REPORTED_IMPORT_ERRORS = 20
+
+def upsert_subscribers(rows, send_welcome=False):
+    """Insert a batch of subscribers; existing addresses only change if the row sets is_active"""
+    insert = postgresql_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
+    table = NewsletterSubscriber.__table__
+    now = datetime.utcnow()
+    
+    keep_status, set_status = [], []
+    for row in rows:
+        values = {
+            'email': row['email'],
+            'is_active': row.get('is_active', True),
+            'subscribed_at': row.get('subscribed_at', now),
+            'welcome_email_sent': not send_welcome,
+        }
+        (set_status if 'is_active' in row else keep_status).append(values)
+    
+    if keep_status:
+        db.session.execute(insert(table).on_conflict_do_nothing(index_elements=['email']), keep_status)
+    if set_status:
+        statement = insert(table)
+        db.session.execute(
+            statement.on_conflict_do_update(index_elements=['email'], set_={'is_active': statement.excluded.is_active}),
+            set_status
+        )
+    
+    # Core inserts bypass the session listeners that maintain the segments
+    refresh_segment_membership(db.session.connection(), table.c.email.in_([row['email'] for row in rows]))
+
+def import_subscribers(stream, file_format, send_welcome=False, batch_size=SUBSCRIBER_IMPORT_BATCH):
+    """Import a CSV/NDJSON stream of subscribers in one transaction and return counts
+    
+    Imported subscribers are marked as already welcomed unless send_welcome
+    is set, so loading an old list doesn't trigger a welcome email per address.
+    """
+    stats = {'rows': 0, 'invalid': 0, 'duplicates': 0, 'added': 0, 'errors': []}
+    before = db.session.query(func.count(NewsletterSubscriber.id)).scalar()
+    
+    try:
+        batch = {}
+        for line_number, row in read_rows(stream, file_format):
+            stats['rows'] += 1
+            if isinstance(row, InvalidRow):
+                stats['invalid'] += 1
+                if len(stats['errors']) < MAX_REPORTED_IMPORT_ERRORS:
+                    stats['errors'].append(f'line {line_number}: {row}')
+                continue
+            
+            if row['email'] in batch:
+                stats['duplicates'] += 1
+            batch[row['email']] = row  # The last row for an address wins
+            if len(batch) >= batch_size:
+                upsert_subscribers(list(batch.values()), send_welcome)
+                batch = {}
+        
+        if batch:
+            upsert_subscribers(list(batch.values()), send_welcome)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    stats['added'] = db.session.query(func.count(NewsletterSubscriber.id)).scalar() - before
+    if send_welcome and stats['added']:
+        with work_condition:
+            work_condition.notify_all()  # Wake the welcome mailer
+    return stats
+
+def iter_subscribers(batch_size=SUBSCRIBER_EXPORT_BATCH):
+    """Yield every subscriber as a dict of EXPORT_FIELDS, reading the table in id order one page at a time"""
+    table = NewsletterSubscriber.__table__
+    columns = [table.c.id] + [table.c[field] for field in EXPORT_FIELDS]
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*columns).where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1]['id']
+
+def export_subscribers_lines(file_format):
+    writer = csv_lines if file_format == 'csv' else ndjson_lines
+    return writer(iter_subscribers())
+
+def export_subscribers_response(file_format):
+    """Streaming download of every subscriber"""
+    filename = f"newsletter_subscribers_{datetime.utcnow().strftime('%Y%m%d')}.{file_format}"
+    return app.response_class(
+        stream_with_context(export_subscribers_lines(file_format)),
+        mimetype=FORMATS[file_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.cli.command('import-subscribers')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(list(FORMATS)), help='Default: from the file extension')
+@click.option('--send-welcome', is_flag=True, help='Send the welcome email to the new subscribers')
+def import_subscribers_command(path, file_format, send_welcome):
+    """Import newsletter subscribers from a CSV or NDJSON file"""
+    with open(path, 'rb') as f:
+        stats = import_subscribers(f, file_format or format_for(path), send_welcome=send_welcome)
+    
+    for error in stats['errors']:
+        print(f"⚠️ {error}")
+    print(f"📥 {stats['rows']} rows: {stats['added']} new subscribers, "
+          f"{stats['duplicates']} duplicate rows, {stats['invalid']} invalid rows")
+
+@app.cli.command('export-subscribers')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'file_format', type=click.Choice(list(FORMATS)), help='Default: from the file extension')
+def export_subscribers_command(path, file_format):
+    """Export every newsletter subscriber to a CSV or NDJSON file"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.writelines(export_subscribers_lines(file_format or format_for(path)))
+    print(f"📤 Subscribers exported to {path}")
+
+ANNOUNCEMENT_SENDING_LEASE = 5 * 60  # seconds before an in-app send that went quiet loses its claim
+ANNOUNCEMENT_SENDING_PAGE_SIZE = 100
+
+def announcement_unclaimed(now=None):
+    """Criterion for announcements that no in-app send holds a live lease on"""
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=ANNOUNCEMENT_SENDING_LEASE)
+    return or_(Announcement.sending_since.is_(None), Announcement.sending_since < cutoff)
+
+def lease_announcement(announcement_id, since):
+    """Statement setting (or, with since=None, releasing) the in-app sending lease of an announcement"""
+    return Announcement.__table__.update().where(Announcement.id == announcement_id).values(
+        sending_since=since, updated_at=Announcement.updated_at  # Not a content change
+    )
+
+@job_handler('send_announcement')
+def send_announcement_job(announcement_id):
+    announcement = db.session.get(Announcement, announcement_id)
+    if announcement and not send_announcement_to_newsletter(announcement):
+        raise RuntimeError(f"Announcement {announcement_id} was not delivered to every subscriber")
+
 def send_announcement_to_newsletter(announcement):
-    """Send announcement to all newsletter subscribers"""
+    """Send announcement to the newsletter subscribers that haven't received it yet
+    
+    Every delivery is recorded in NewsletterSent like the mailer's
+    acknowledgements, so a retry (or the external mailer) picks up where an
+    interrupted run left off. The announcement is leased while it is being
+    sent, so the mailer APIs skip it instead of serving the same recipients,
+    and recipients are paged by subscriber id. Returns False if some emails
+    failed or another sender holds the lease.
+    """
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        lease_announcement(announcement.id, now)
+        .where(Announcement.sent_to_newsletter == False, announcement_unclaimed(now))
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        db.session.refresh(announcement)
+        return announcement.sent_to_newsletter
+    
     try:
-        subscribers = NewsletterSubscriber.query.filter_by(is_active=True).all()
+        snapshot_recipients_target(announcement.id)
+        recipients_query, subscriber_id = pending_recipients(announcement)
+        insert = postgresql_insert if db.engine.dialect.name == 'postgresql' else sqlite_insert
         
-        for subscriber in subscribers:
-            # Send announcement email
-            subject = f"Ανακοίνωση: {announcement.title}"
-            
-            body = f"""
+        # Send announcement email
+        subject = f"Ανακοίνωση: {announcement.title}"
+        
+        body = f"""
 🌟 Νέα Ανακοίνωση από τη Βλασία! 🌟
 
 {announcement.title}
@@ -569,37 +2155,88 @@ def send_announcement_to_newsletter(announcement):
 Η ομάδα της Βλασίας
 🌿 vlasia.gr 🌿
 """
+        
+        sent = failed = 0
+        after_user_id = 0
+        while True:
+            page = recipients_query.filter(subscriber_id > after_user_id).order_by(subscriber_id) \
+                .limit(ANNOUNCEMENT_SENDING_PAGE_SIZE).all()
+            if not page:
+                break
+            after_user_id = page[-1][0]
             
-            # Send email using Gmail SMTP
-            send_email_via_gmail(subscriber.email, subject, body)
-            time.sleep(1)  # Small delay between emails
+            for user_id, email in page:
+                # Send email using Gmail SMTP (paced by email_rate_limiter)
+                if not send_email_via_gmail(email, subject, body):
+                    failed += 1  # Left unrecorded so the next attempt retries it
+                    continue
+                
+                sent += 1
+                # A delivery someone else recorded meanwhile is already counted
+                recorded = db.session.execute(
+                    insert(NewsletterSent.__table__)
+                    .values(user_id=user_id, announcement_id=announcement.id, status='sent')
+                    .on_conflict_do_nothing(index_elements=['user_id', 'announcement_id'])
+                ).rowcount
+                if recorded:
+                    record_deliveries({(user_id, announcement.id): 'sent'})
+                db.session.execute(lease_announcement(announcement.id, datetime.utcnow()))
+                heartbeat_job()
+                db.session.commit()
         
-        # Mark announcement as sent
-        announcement.sent_to_newsletter = True
-        db.session.commit()
+        if not failed and not db.session.query(pending_recipients(announcement)[0].exists()).scalar():
+            # Mark announcement as sent (unless someone joined its segment meanwhile)
+            announcement.sent_to_newsletter = True
+            db.session.commit()
+        invalidate_pages('announcement')
         
-        print(f"Announcement '{announcement.title}' sent to {len(subscribers)} subscribers")
-        return True
+        print(f"Announcement '{announcement.title}' sent to {sent}/{sent + failed} subscribers")
+        return not failed
         
     except Exception as e:
+        db.session.rollback()
         print(f"Error sending announcement to newsletter: {e}")
         return False
+    
+    finally:
+        db.session.execute(lease_announcement(announcement.id, None))
+        db.session.commit()
 
-def send_contact_notifications():
-    """Send contact form notifications to admin (only for unsent ones)"""
-    try:
-        # Get contact messages that haven't sent notifications yet
-        unsent_contacts = ContactMessage.query.filter_by(notification_sent=False).all()
-        
-        if not unsent_contacts:
-            print("No new contact messages to notify about")
-            return True
-        
-        for contact in unsent_contacts:
-            # Send notification email to admin
-            subject = f"Νέο μήνυμα επικοινωνίας: {contact.subject}"
-            
-            body = f"""
+CONTACT_NOTIFICATION_EMAIL = "vlasia.blog@gmail.com"
+CONTACT_NOTIFICATION_LEASE = 5 * 60  # seconds before a sender that went quiet loses its claim
+
+@job_handler('send_contact_notification')
+def send_contact_notification_job(contact_id):
+    if not send_contact_notification(contact_id):
+        raise RuntimeError(f"Notification for contact message {contact_id} was not sent")
+
+def send_contact_notification(contact_id):
+    """Send the admin notification for one contact message; True once it has been sent
+    
+    The message is leased while the email goes out, so the external sender
+    doesn't pick it up as well; a lease left by a crashed worker expires,
+    and notification_sent is only set once the email has been sent.
+    """
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        ContactMessage.__table__.update()
+        .where(ContactMessage.id == contact_id,
+               ContactMessage.notification_sent == False,
+               or_(ContactMessage.notification_sending_since.is_(None),
+                   ContactMessage.notification_sending_since < now - timedelta(seconds=CONTACT_NOTIFICATION_LEASE)))
+        .values(notification_sending_since=now)
+    ).rowcount
+    db.session.commit()
+    
+    contact = db.session.get(ContactMessage, contact_id)
+    if not claimed:
+        # Already notified (or the message is gone); otherwise another sender holds the lease
+        return contact is None or contact.notification_sent
+    
+    # Send notification email to admin
+    subject = f"Νέο μήνυμα επικοινωνίας: {contact.subject}"
+    
+    body = f"""
 Νέα επικοινωνία από το site:
 
 Όνομα: {contact.first_name} {contact.last_name}
@@ -612,23 +2249,34 @@ Email: {contact.email}
 ---
 Αποστάλθηκε: {contact.created_at.strftime('%d/%m/%Y %H:%M')}
 """
-            
-            # Send email using Gmail SMTP
-            if send_email_via_gmail("vlasia.blog@gmail.com", subject, body):
-                # Mark as sent
-                contact.notification_sent = True
-                db.session.commit()
-                print(f"Contact notification sent for message {contact.id}")
-            else:
-                print(f"Failed to send contact notification for message {contact.id}")
-            
-            time.sleep(1)  # Small delay between emails
-        
+    
+    # Send email using Gmail SMTP
+    sent = send_email_via_gmail(CONTACT_NOTIFICATION_EMAIL, subject, body)
+    
+    # Record the outcome and release the lease; a retry (or the external sender) delivers a failed one
+    contact.notification_sent = sent
+    contact.notification_sending_since = None
+    db.session.commit()
+    if sent:
+        print(f"Contact notification sent for message {contact.id}")
         return True
-        
-    except Exception as e:
-        print(f"Error sending contact notifications: {e}")
-        return False
+    
+    print(f"Failed to send contact notification for message {contact.id}")
+    return False
+
+def send_contact_notifications():
+    """Queue notifications for every contact message that hasn't had one yet; returns how many"""
+    unsent_contacts = db.session.query(ContactMessage.id).filter_by(notification_sent=False).all()
+    for (contact_id,) in unsent_contacts:
+        enqueue_job('send_contact_notification', contact_id=contact_id)
+    db.session.commit()
+    
+    if not unsent_contacts:
+        print("No new contact messages to notify about")
+    return len(unsent_contacts)
+
+# Shared pace for every email the app sends itself; adapts to Gmail's replies
+email_rate_limiter = AdaptiveRateLimiter(rate=1.0, burst=3, max_rate=10.0)
 
 def send_email_via_gmail(to_email, subject, body):
     """Send email using Gmail SMTP"""
@@ -644,6 +2292,8 @@ def send_email_via_gmail(to_email, subject, body):
         
         msg.attach(MIMEText(body, 'plain'))
         
+        email_rate_limiter.acquire()
+        
         # Connect to Gmail SMTP
         server = smtplib.SMTP('smtp.gmail.com', 587)
         server.starttls()
@@ -654,10 +2304,12 @@ def send_email_via_gmail(to_email, subject, body):
         server.sendmail("vlasia.blog@gmail.com", to_email, text)
         server.quit()
         
+        email_rate_limiter.record()
         print(f"✅ Announcement email sent successfully to {to_email}")
         return True
         
     except Exception as e:
+        email_rate_limiter.record(e)
         print(f"❌ Error sending announcement email to {to_email}: {e}")
         return False
 
@@ -667,7 +2319,12 @@ def api_pending_contacts():
     """Get pending contact messages for email sending (only unsent notifications)"""
     try:
         # Get contact messages that haven't sent notifications yet
-        contacts = ContactMessage.query.filter_by(notification_sent=False).order_by(ContactMessage.created_at.desc()).limit(50).all()
+        lease_cutoff = datetime.utcnow() - timedelta(seconds=CONTACT_NOTIFICATION_LEASE)
+        contacts = ContactMessage.query.filter(
+            ContactMessage.notification_sent == False,
+            or_(ContactMessage.notification_sending_since.is_(None),
+                ContactMessage.notification_sending_since < lease_cutoff)
+        ).order_by(ContactMessage.created_at.desc()).limit(50).all()
         
         result = []
         for contact in contacts:
@@ -711,10 +2368,17 @@ def api_pending_newsletters():
 
 @app.route('/api/all_newsletters')
 def api_all_newsletters():
-    """Get all active newsletter subscribers (for announcements)"""
+    """Get all active newsletter subscribers (for announcements); ?category= limits them to that segment"""
     try:
-        # Get all active newsletter subscribers
-        subscribers = NewsletterSubscriber.query.filter_by(is_active=True).order_by(NewsletterSubscriber.subscribed_at.desc()).all()
+        category = request.args.get('category')
+        if category:
+            recipients_query, subscriber_id = segment_recipients(category)
+            ids = recipients_query.with_entities(subscriber_id)
+            subscribers = NewsletterSubscriber.query.filter(NewsletterSubscriber.id.in_(ids)) \
+                .order_by(NewsletterSubscriber.subscribed_at.desc()).all()
+        else:
+            # Get all active newsletter subscribers
+            subscribers = NewsletterSubscriber.query.filter_by(is_active=True).order_by(NewsletterSubscriber.subscribed_at.desc()).all()
         
         result = []
         for subscriber in subscribers:
@@ -765,14 +2429,15 @@ def api_mark_contact_notification_sent(contact_id):
 def api_pending_announcements():
     """Get pending announcements for email sending (only unsent ones)"""
     try:
-        # Get announcements that haven't been sent to newsletter yet
-        announcements = Announcement.query.filter_by(
+        # Get announcements that haven't been sent to newsletter yet, in the order they should go out
+        announcements = {announcement.id: announcement for announcement in Announcement.query.filter_by(
             is_published=True, 
             sent_to_newsletter=False
-        ).order_by(Announcement.created_at.desc()).all()
+        ).filter(announcement_unclaimed())}
+        order = dispatch_scheduler.order([(a.id, a.priority, a.created_at) for a in announcements.values()])
         
         result = []
-        for announcement in announcements:
+        for announcement in (announcements[announcement_id] for announcement_id in order):
             result.append({
                 'id': announcement.id,
                 'title': announcement.title,
@@ -792,8 +2457,15 @@ def api_mark_announcement_sent(announcement_id):
     """Mark announcement as sent to newsletter"""
     try:
         announcement = Announcement.query.get_or_404(announcement_id)
+        data = request.get_json(silent=True) or {}
+        if 'sent_count' in data:
+            # The sender reports the outcome of the whole run
+            announcement.sent_count = int(data['sent_count'])
+            announcement.failed_count = int(data.get('failed_count', 0))
+            announcement.recipients_target = announcement.delivered_count
         announcement.sent_to_newsletter = True
         db.session.commit()
+        invalidate_pages('announcement')
         return {'success': True, 'message': f'Announcement {announcement_id} marked as sent'}
     except Exception as e:
         return {'success': False, 'error': str(e)}, 500
@@ -854,11 +2526,13 @@ def api_new_subscribers():
         }), 500
 
 # Newsletter Mailer API Endpoints
-@app.route('/api/get-newsletter-batch', methods=['GET'])
-def api_get_newsletter_batch():
-    """Get newsletter data for external mailer system"""
-    try:
-        # Check API key
+NEWSLETTER_BATCH_DEFAULT_LIMIT = 500
+NEWSLETTER_BATCH_MAX_LIMIT = 5000
+
+def newsletter_api_key_required(f):
+    """Reject requests that don't carry the newsletter mailer API key"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({'error': 'Unauthorized'}), 401
@@ -867,69 +2541,223 @@ def api_get_newsletter_batch():
         if api_key != os.getenv('NEWSLETTER_API_KEY', 'your_secret_api_key'):
             return jsonify({'error': 'Invalid API key'}), 401
         
-        # Find the latest announcement that hasn't been sent to all subscribers
-        latest_announcement = Announcement.query.filter(
-            Announcement.is_published == True,
-            Announcement.sent_to_newsletter == False
-        ).order_by(Announcement.created_at.desc()).first()
+        return f(*args, **kwargs)
+    return decorated_function
+
+def snapshot_recipients_target(announcement_id):
+    """Fix the number of recipients an announcement is going out to, the first time it is sent
+    
+    Counts its segment once; afterwards the segment updates keep the target
+    in step (see adjust_recipients_targets).
+    """
+    announcement = db.session.get(Announcement, announcement_id)
+    if announcement.recipients_target is not None:
+        return
+    recipients, _ = segment_recipients(announcement.category)
+    db.session.execute(
+        Announcement.__table__.update()
+        .where(Announcement.id == announcement_id, Announcement.recipients_target.is_(None))
+        .values(recipients_target=recipients.order_by(None).count(),
+                updated_at=Announcement.updated_at)  # Delivery progress, not a content change
+    )
+
+def pending_recipients(announcement):
+    """Subscribers in the announcement's segment with no delivery recorded for it (one anti-join), and the id column to page by"""
+    already_sent = exists().where(and_(
+        NewsletterSent.user_id == NewsletterSubscriber.id,
+        NewsletterSent.announcement_id == announcement.id
+    ))
+    recipients_query, subscriber_id = segment_recipients(announcement.category)
+    return recipients_query.filter(~already_sent), subscriber_id
+
+def record_deliveries(statuses):
+    """Bump the delivery counters for newly recorded deliveries and flag finished announcements
+    
+    statuses maps (user_id, announcement_id) to 'sent' or 'failed'. The counters
+    are incremented in the database, so concurrent acknowledgements don't lose
+    updates. An announcement is finished once its counters reach its
+    recipients target, an O(1) check; subscribers who join or leave its
+    segment mid-send move the target instead of being looked up per ack.
+    Only finishing changes updated_at (the pages show it), so conditional
+    GETs keep matching while acknowledgements come in.
+    """
+    counts = {}
+    for (_, announcement_id), status in statuses.items():
+        sent, failed = counts.get(announcement_id, (0, 0))
+        counts[announcement_id] = (sent + (status == 'sent'), failed + (status == 'failed'))
+    
+    untargeted = db.session.query(Announcement.id).filter(
+        Announcement.id.in_(counts), Announcement.recipients_target.is_(None)
+    ).all()
+    for announcement_id, in untargeted:
+        snapshot_recipients_target(announcement_id)
+    
+    for announcement_id, (sent, failed) in counts.items():
+        db.session.execute(
+            Announcement.__table__.update()
+            .where(Announcement.id == announcement_id)
+            .values(sent_count=Announcement.sent_count + sent,
+                    failed_count=Announcement.failed_count + failed,
+                    updated_at=Announcement.updated_at)  # Keeps the pages' ETags during a fan-out
+        )
+    
+    if not counts:
+        return []
+    
+    completed = [announcement_id for announcement_id, in db.session.query(Announcement.id).filter(
+        Announcement.id.in_(counts),
+        Announcement.sent_to_newsletter == False,
+        Announcement.sent_count + Announcement.failed_count >= Announcement.recipients_target
+    )]
+    if completed:
+        db.session.execute(
+            Announcement.__table__.update()
+            .where(Announcement.id.in_(completed))
+            .values(sent_to_newsletter=True)
+        )
+    return completed
+
+def pending_newsletter_announcements():
+    """(id, priority, created_at) of the published announcements not yet sent to everyone, nor being sent by the site"""
+    return db.session.query(
+        Announcement.id, Announcement.priority, Announcement.created_at
+    ).filter(
+        Announcement.is_published == True,
+        Announcement.sent_to_newsletter == False,
+        announcement_unclaimed()
+    ).all()
+
+def newsletter_page(announcement_id, after_user_id, limit):
+    """One page of an announcement's remaining recipients: (announcement, recipients, has_more)
+    
+    An announcement with nobody left from the start of its segment (e.g. the
+    rest unsubscribed) is marked finished, so it doesn't hold up the queue.
+    """
+    announcement = db.session.get(Announcement, announcement_id)
+    if announcement.recipients_target is None:
+        snapshot_recipients_target(announcement.id)
+        db.session.commit()
+    
+    recipients_query, subscriber_id = pending_recipients(announcement)
+    pending = recipients_query.filter(
+        subscriber_id > after_user_id
+    ).order_by(subscriber_id).limit(limit + 1).all()
+    
+    if not pending and not after_user_id:
+        announcement.sent_to_newsletter = True
+        db.session.commit()
+        invalidate_pages('announcement')
+    
+    recipients = [{'user_id': user_id, 'email': email} for user_id, email in pending[:limit]]
+    return announcement, recipients, len(pending) > limit
+
+def newsletter_page_data(announcement, recipients, has_more, after_user_id):
+    """JSON body of one newsletter page"""
+    return {
+        'announcement_id': announcement.id,
+        'subject': announcement.title,
+        'body_html': f"""
+                <h1>{announcement.title}</h1>
+                <p><strong>Κατηγορία:</strong> {announcement.category}</p>
+                <p><strong>Προτεραιότητα:</strong> {announcement.priority}</p>
+                <hr>
+                <div>{announcement.content}</div>
+                <hr>
+                <p><small>Αποστάλθηκε από το site Βλασια στις {announcement.created_at.strftime('%d/%m/%Y %H:%M')}</small></p>
+            """,
+        'priority': announcement.priority,
+        'recipients': recipients,
+        'has_more': has_more,
+        'next_after_user_id': recipients[-1]['user_id'] if recipients else after_user_id
+    }
+
+def newsletter_batches(cursors, limit):
+    """Pages for all pending announcements at once, each continuing from its cursor
+    
+    cursors maps announcement id -> last user id the mailer got for it. The
+    limit is split over the announcements by dispatch_scheduler; while an
+    urgent announcement has recipients left, only urgent ones are served.
+    `has_more` is true while any announcement may still have recipients.
+    """
+    pending_announcements = pending_newsletter_announcements()
+    waiting = {announcement_id for announcement_id, _, _ in pending_announcements}
+    
+    pages = []
+    for tier in dispatch_scheduler.allocate(pending_announcements, limit):
+        if pages:
+            break  # A higher tier has work, the rest waits for the next call
+        for announcement_id, page_limit in tier:
+            after_user_id = cursors.get(announcement_id, 0)
+            announcement, recipients, has_more = newsletter_page(announcement_id, after_user_id, page_limit)
+            if not has_more:
+                waiting.discard(announcement_id)
+            if recipients:
+                pages.append(newsletter_page_data(announcement, recipients, has_more, after_user_id))
+    
+    return {'announcements': pages, 'has_more': bool(waiting)}
+
+@app.route('/api/get-newsletter-batch', methods=['GET'])
+@newsletter_api_key_required
+def api_get_newsletter_batch():
+    """Get newsletter data for external mailer system
+    
+    Recipients are paginated by subscriber id: pass the returned
+    `next_after_user_id` as `after_user_id` (together with `announcement_id`)
+    to fetch the next page. Which announcement a page belongs to is up to
+    dispatch_scheduler, so at every page an urgent announcement can take over
+    from the one being sent, and priorities share the throughput; when the
+    answer is for another announcement, paging restarts from its beginning.
+    `has_more` stays true while any announcement has recipients left.
+    
+    With `all=1` the answer covers every pending announcement instead, as
+    {'announcements': [page, ...], 'has_more': ...}; the mailer passes one
+    `cursor=<announcement_id>:<next_after_user_id>` per announcement it has
+    paged through, and `limit` is the size of the whole answer.
+    """
+    try:
+        announcement_id = request.args.get('announcement_id', type=int)
+        after_user_id = request.args.get('after_user_id', 0, type=int)
+        limit = min(max(request.args.get('limit', NEWSLETTER_BATCH_DEFAULT_LIMIT, type=int), 1),
+                    NEWSLETTER_BATCH_MAX_LIMIT)
         
-        if not latest_announcement:
-            return jsonify({'message': 'No new announcements to send'}), 200
+        if request.args.get('all', type=int):
+            try:
+                cursors = dict(tuple(int(part) for part in cursor.split(':', 1))
+                               for cursor in request.args.getlist('cursor'))
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            return jsonify(newsletter_batches(cursors, limit))
         
-        # Get all active subscribers who haven't received this announcement
-        active_subscribers = NewsletterSubscriber.query.filter(
-            NewsletterSubscriber.is_active == True
-        ).all()
+        pending_announcements = pending_newsletter_announcements()
         
-        # Filter out subscribers who already received this announcement
-        recipients = []
-        for subscriber in active_subscribers:
-            already_sent = NewsletterSent.query.filter_by(
-                user_id=subscriber.id,
-                announcement_id=latest_announcement.id
-            ).first()
-            
-            if not already_sent:
-                recipients.append({
-                    'user_id': subscriber.id,
-                    'email': subscriber.email
-                })
+        page = None
+        remaining = len(pending_announcements)
+        for candidate_id in dispatch_scheduler.order(pending_announcements):
+            after = after_user_id if candidate_id == announcement_id else 0
+            announcement, recipients, has_more = newsletter_page(candidate_id, after, limit)
+            if recipients:
+                page = newsletter_page_data(announcement, recipients, has_more or remaining > 1, after)
+                break
+            remaining -= 1
         
-        if not recipients:
-            return jsonify({'message': 'All subscribers have already received this announcement'}), 200
+        if not page:
+            return jsonify({'message': 'No new announcements to send'}), 200
+        
+        dispatch_scheduler.charge(announcement.priority, announcement.created_at, len(recipients))
+        if announcement_id and announcement_id != announcement.id:
+            print(f"🔀 Newsletter batch switched from announcement {announcement_id} to {announcement.id} ({announcement.priority})")
         
         # Return newsletter data
-        return jsonify({
-            'announcement_id': latest_announcement.id,
-            'subject': latest_announcement.title,
-            'body_html': f"""
-                <h1>{latest_announcement.title}</h1>
-                <p><strong>Κατηγορία:</strong> {latest_announcement.category}</p>
-                <p><strong>Προτεραιότητα:</strong> {latest_announcement.priority}</p>
-                <hr>
-                <div>{latest_announcement.content}</div>
-                <hr>
-                <p><small>Αποστάλθηκε από το site Βλασια στις {latest_announcement.created_at.strftime('%d/%m/%Y %H:%M')}</small></p>
-            """,
-            'recipients': recipients
-        })
+        return jsonify(page)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/mark-email-sent', methods=['POST'])
+@newsletter_api_key_required
 def api_mark_email_sent():
     """Mark an email as sent in the database"""
     try:
-        # Check API key
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Unauthorized'}), 401
-        
-        api_key = auth_header.split(' ')[1]
-        if api_key != os.getenv('NEWSLETTER_API_KEY', 'your_secret_api_key'):
-            return jsonify({'error': 'Invalid API key'}), 401
-        
         data = request.get_json()
         user_id = data.get('user_id')
         announcement_id = data.get('announcement_id')
@@ -953,24 +2781,145 @@ def api_mark_email_sent():
             status='sent'
         )
         db.session.add(newsletter_sent)
+        db.session.flush()
+        
+        # Count the delivery and check if all subscribers have received this announcement
+        if record_deliveries({(user_id, announcement_id): 'sent'}):
+            db.session.commit()
+            invalidate_pages('announcement')
+        else:
+            db.session.commit()
+        
+        return jsonify({'success': True, 'message': 'Email marked as sent'})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/mark-email-sent-batch', methods=['POST'])
+@newsletter_api_key_required
+def api_mark_email_sent_batch():
+    """Mark a batch of emails as sent (or failed) in a single transaction"""
+    try:
+        data = request.get_json(silent=True) or {}
+        records = data.get('records')
+        
+        if not isinstance(records, list) or not records:
+            return jsonify({'error': 'Missing records'}), 400
+        
+        # Normalise the batch, keeping the last status reported for each pair
+        statuses = {}
+        for record in records:
+            try:
+                key = (int(record['user_id']), int(record['announcement_id']))
+            except (KeyError, TypeError, ValueError):
+                return jsonify({'error': f'Invalid record: {record}'}), 400
+            
+            status = record.get('status', 'sent')
+            if status not in ('sent', 'failed'):
+                return jsonify({'error': f'Invalid status: {status}'}), 400
+            statuses[key] = status
+        
+        requested = len(statuses)
+        user_ids = {user_id for user_id, _ in statuses}
+        announcement_ids = {announcement_id for _, announcement_id in statuses}
+        
+        # One query finds every pair that is already recorded
+        existing = db.session.query(NewsletterSent.user_id, NewsletterSent.announcement_id).filter(
+            NewsletterSent.user_id.in_(user_ids),
+            NewsletterSent.announcement_id.in_(announcement_ids)
+        ).all()
+        for user_id, announcement_id in existing:
+            statuses.pop((user_id, announcement_id), None)
+        
+        db.session.add_all([
+            NewsletterSent(user_id=user_id, announcement_id=announcement_id, status=status)
+            for (user_id, announcement_id), status in statuses.items()
+        ])
+        db.session.flush()
+        
+        completed = record_deliveries(statuses)
         db.session.commit()
+        if completed:
+            invalidate_pages('announcement')
         
-        # Check if all subscribers have received this announcement
-        total_subscribers = NewsletterSubscriber.query.filter_by(is_active=True).count()
-        total_sent = NewsletterSent.query.filter_by(announcement_id=announcement_id).count()
+        return jsonify({
+            'success': True,
+            'recorded': len(statuses),
+            'duplicates': requested - len(statuses),
+            'completed_announcements': completed
+        })
         
-        if total_sent >= total_subscribers:
-            # Mark announcement as sent to newsletter
-            announcement = Announcement.query.get(announcement_id)
-            if announcement:
-                announcement.sent_to_newsletter = True
-                db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+WAIT_FOR_WORK_DEFAULT_TIMEOUT = 20
+WAIT_FOR_WORK_MAX_TIMEOUT = 25  # Stay under gunicorn's default 30s worker timeout
+WAIT_FOR_WORK_DB_POLL = 2  # Re-check the database this often to see commits from other workers
+# Each waiting long-poll holds a worker thread; past this many per process, callers are told to come back later
+WAIT_FOR_WORK_MAX_WAITERS = int(os.environ.get('WAIT_FOR_WORK_MAX_WAITERS', 2))
+WAIT_FOR_WORK_RETRY_AFTER = 30  # seconds
+wait_for_work_slots = threading.BoundedSemaphore(WAIT_FOR_WORK_MAX_WAITERS)
+
+def get_pending_work():
+    """Counts of pending mailer work plus a token that changes whenever new work is committed"""
+    max_announcement_id = db.session.query(func.max(Announcement.id)).scalar() or 0
+    max_subscriber_id = db.session.query(func.max(NewsletterSubscriber.id)).scalar() or 0
+    max_contact_id = db.session.query(func.max(ContactMessage.id)).scalar() or 0
+    
+    pending = {
+        'announcements': Announcement.query.filter_by(is_published=True, sent_to_newsletter=False).count(),
+        'welcome_emails': NewsletterSubscriber.query.filter_by(is_active=True, welcome_email_sent=False).count(),
+        'contact_notifications': ContactMessage.query.filter_by(notification_sent=False).count()
+    }
+    token = (f"{max_announcement_id}.{max_subscriber_id}.{max_contact_id}."
+             f"{pending['announcements']}.{pending['welcome_emails']}.{pending['contact_notifications']}")
+    return token, pending
+
+@app.route('/api/wait-for-work', methods=['GET'])
+@newsletter_api_key_required
+def api_wait_for_work():
+    """Long-poll: return as soon as the work token differs from `since`, or on timeout
+    
+    The wait occupies a worker, so run gunicorn with a threaded worker class
+    (e.g. `-k gthread --threads 8`) when mailers use daemon mode; at most
+    WAIT_FOR_WORK_MAX_WAITERS polls wait at once per process, the rest get a 503.
+    """
+    if not wait_for_work_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many waiting clients'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(WAIT_FOR_WORK_RETRY_AFTER)
+        return response
+    try:
+        since = request.args.get('since')
+        timeout = min(max(request.args.get('timeout', WAIT_FOR_WORK_DEFAULT_TIMEOUT, type=int), 0),
+                      WAIT_FOR_WORK_MAX_TIMEOUT)
+        deadline = time.monotonic() + timeout
         
-        return jsonify({'success': True, 'message': 'Email marked as sent'})
+        token, pending = get_pending_work()
+        while token == since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            # End the read transaction so the next check sees fresh commits
+            db.session.rollback()
+            with work_condition:
+                work_condition.wait(min(remaining, WAIT_FOR_WORK_DB_POLL))
+            token, pending = get_pending_work()
+        
+        return jsonify({
+            'changed': token != since,
+            'since': token,
+            'pending': pending
+        })
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    finally:
+        wait_for_work_slots.release()
 
 # Error handlers
 @app.errorhandler(404)
@@ -6,15 +6,23 @@ This script runs automatically and sends emails for new contact messages and new
 
 import os
 import sys
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import asyncio
+import functools
+import signal
+import threading
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import time
+from pathlib import Path
 import logging
 
+# Shared sending components live next to the newsletter mailer
+sys.path.insert(0, str(Path(__file__).parent / 'newsletter_mailer'))
+from message_cache import MessageCache, MessageTemplate
+from rate_limiter import AdaptiveRateLimiter
+from smtp_session import SMTPSession
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -29,34 +37,69 @@ logging.basicConfig(
 GMAIL_USER = "vlasia.blog@gmail.com"
 GMAIL_PASSWORD = "nxwh upvi kges tfqd"  # App password
 SERVER_URL = "http://138.68.21.230"  # Your Digital Ocean server
+EMAIL_CONCURRENCY = int(os.getenv('EMAIL_SENDER_CONCURRENCY', '4'))  # Announcement sends in flight at once
+# Each pipeline gets its own slots, so contact notifications never queue behind an announcement fan-out
+PIPELINE_CONCURRENCY = {'contacts': 2, 'welcome': 2, 'announcements': EMAIL_CONCURRENCY, 'wait': 1}
+NEWSLETTER_API_KEY = os.getenv('NEWSLETTER_API_KEY', '')  # Needed for /api/wait-for-work in daemon mode
+WAIT_FOR_WORK_TIMEOUT = 20
+
+# Rendered bodies of the messages sent to many recipients (announcements, welcome emails)
+message_cache = MessageCache()
+
+# Paces contact notifications and welcome emails; starts at the old one-per-second pace and adapts to Gmail's replies
+rate_limiter = AdaptiveRateLimiter(rate=1.0, burst=3, max_rate=10.0)
+
+# Announcement fan-outs draw from a budget of their own, so they can't use up the one above
+announcement_rate_limiter = AdaptiveRateLimiter(rate=1.0, burst=3, max_rate=10.0)
+
+# One reusable Gmail session per I/O thread
+smtp_local = threading.local()
+smtp_sessions = []
+smtp_sessions_lock = threading.Lock()
+
+def record_pushback(error):
+    """Gmail closing the channel with 421 limits the whole account, so both budgets back off"""
+    rate_limiter.record(error)
+    announcement_rate_limiter.record(error)
+
+def get_smtp_session():
+    """Return the SMTP session owned by the current thread"""
+    session = getattr(smtp_local, 'session', None)
+    if session is None:
+        session = SMTPSession('smtp.gmail.com', 587, GMAIL_USER, GMAIL_PASSWORD, on_pushback=record_pushback)
+        smtp_local.session = session
+        with smtp_sessions_lock:
+            smtp_sessions.append(session)
+    return session
 
-def send_email(to_email, subject, body, is_html=False):
-    """Send email using Gmail SMTP"""
+def close_smtp_sessions():
+    """Close every SMTP session opened by the I/O threads"""
+    with smtp_sessions_lock:
+        for session in smtp_sessions:
+            session.close()
+        smtp_sessions.clear()
+
+def send_email(to_email, subject, body, is_html=False, limiter=rate_limiter):
+    """Send email using Gmail SMTP, paced by limiter"""
     try:
-        msg = MIMEMultipart()
-        msg['From'] = GMAIL_USER
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        if is_html:
-            msg.attach(MIMEText(body, 'html'))
-        else:
-            msg.attach(MIMEText(body, 'plain'))
+        # Render and encode each distinct message once; only To/Message-ID change per recipient
+        template = message_cache.get(
+            (subject, body, is_html),
+            lambda: MessageTemplate(GMAIL_USER, subject, body, 'html' if is_html else 'plain', 'mixed')
+        )
+        text = template.render(to_email)
         
-        # Connect to Gmail SMTP
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(GMAIL_USER, GMAIL_PASSWORD)
+        limiter.acquire()
         
-        # Send email
-        text = msg.as_string()
-        server.sendmail(GMAIL_USER, to_email, text)
-        server.quit()
+        # Send over this thread's Gmail session (reconnects transparently if needed)
+        get_smtp_session().sendmail(GMAIL_USER, [to_email], text)
         
+        limiter.record()
         logging.info(f"✅ Email sent successfully to {to_email}")
         return True
         
     except Exception as e:
+        limiter.record(e)
         logging.error(f"❌ Error sending email to {to_email}: {e}")
         return False
 
@@ -184,38 +227,6 @@ def mark_newsletter_sent(subscriber_id):
         logging.error(f"❌ Error marking newsletter as sent: {e}")
         return False
 
-def process_contact_notifications():
-    """Process contact notifications (only unsent ones)"""
-    try:
-        # Get contact messages that haven't sent notifications yet
-        response = requests.get(f"{SERVER_URL}/api/pending_contacts")
-        if response.status_code != 200:
-            logging.error(f"HTTP error getting contacts: {response.status_code}")
-            return 0
-        
-        data = response.json()
-        if not data.get('success'):
-            logging.error(f"API error getting contacts: {data.get('error')}")
-            return 0
-        
-        contacts = data.get('contacts', [])
-        contact_count = 0
-        
-        for contact in contacts:
-            if not contact.get('notification_sent', False):
-                logging.info(f"📨 Sending contact notification for: {contact['email']}")
-                if send_contact_notification(contact):
-                    # Mark as sent
-                    mark_contact_notification_sent(contact['id'])
-                    contact_count += 1
-                time.sleep(1)  # Small delay between emails
-        
-        return contact_count
-        
-    except Exception as e:
-        logging.error(f"Error processing contact notifications: {e}")
-        return 0
-
 def mark_contact_notification_sent(contact_id):
     """Mark contact notification as sent (update server)"""
     try:
@@ -235,73 +246,72 @@ def mark_contact_notification_sent(contact_id):
         logging.error(f"❌ Error marking contact notification as sent: {e}")
         return False
 
-def process_announcements():
-    """Process announcements (only unsent ones)"""
+def wait_for_work(since=None):
+    """Long-poll the server until there is new work; returns its response or None on error"""
     try:
-        # Get announcements that haven't been sent to newsletter yet
-        response = requests.get(f"{SERVER_URL}/api/pending_announcements")
+        params = {'timeout': WAIT_FOR_WORK_TIMEOUT}
+        if since:
+            params['since'] = since
+        
+        response = requests.get(
+            f"{SERVER_URL}/api/wait-for-work",
+            headers={'Authorization': f'Bearer {NEWSLETTER_API_KEY}'},
+            params=params,
+            timeout=WAIT_FOR_WORK_TIMEOUT + 15
+        )
         if response.status_code != 200:
-            logging.error(f"HTTP error getting announcements: {response.status_code}")
-            return 0
+            logging.error(f"HTTP error waiting for work: {response.status_code}")
+            return None
         
         data = response.json()
-        if not data.get('success'):
-            logging.error(f"API error getting announcements: {data.get('error')}")
-            return 0
-        
-        announcements = data.get('announcements', [])
-        announcement_count = 0
-        
-        for announcement in announcements:
-            logging.info(f"📢 Sending announcement: {announcement['title']}")
-            if send_announcement_to_newsletter(announcement):
-                # Mark as sent
-                mark_announcement_sent(announcement['id'])
-                announcement_count += 1
-            time.sleep(1)  # Small delay between emails
-        
-        return announcement_count
-        
+        if data.get('changed'):
+            logging.info(f"🔔 New work available: {data.get('pending')}")
+        return data
     except Exception as e:
-        logging.error(f"Error processing announcements: {e}")
-        return 0
+        logging.error(f"Error waiting for work: {e}")
+        return None
 
-def send_announcement_to_newsletter(announcement):
-    """Send announcement to all newsletter subscribers"""
+def get_pending_announcements():
+    """Get announcements that haven't been sent to newsletter yet"""
     try:
-        # Get all active subscribers
-        response = requests.get(f"{SERVER_URL}/api/pending_newsletters")
+        response = requests.get(f"{SERVER_URL}/api/pending_announcements")
         if response.status_code != 200:
-            logging.error(f"HTTP error getting subscribers: {response.status_code}")
-            return False
+            logging.error(f"HTTP error getting announcements: {response.status_code}")
+            return []
         
         data = response.json()
         if not data.get('success'):
-            logging.error(f"API error getting subscribers: {data.get('error')}")
-            return False
+            logging.error(f"API error getting announcements: {data.get('error')}")
+            return []
         
-        # Get all active subscribers (not just pending ones)
-        response = requests.get(f"{SERVER_URL}/api/all_newsletters")
+        return data.get('announcements', [])
+    except Exception as e:
+        logging.error(f"Error getting announcements: {e}")
+        return []
+
+def get_all_newsletter_subscribers(category=None):
+    """Get all active newsletter subscribers (not just pending ones), or only the segment of a category"""
+    try:
+        response = requests.get(f"{SERVER_URL}/api/all_newsletters", params={'category': category} if category else None)
         if response.status_code != 200:
             logging.error(f"HTTP error getting all subscribers: {response.status_code}")
-            return False
+            return None
         
         data = response.json()
         if not data.get('success'):
             logging.error(f"API error getting all subscribers: {data.get('error')}")
-            return False
+            return None
         
-        subscribers = data.get('subscribers', [])
-        
-        if not subscribers:
-            logging.warning("No newsletter subscribers found")
-            return True
-        
-        for subscriber in subscribers:
-            # Send announcement email
-            subject = f"Ανακοίνωση: {announcement['title']}"
-            
-            body = f"""
+        return data.get('subscribers', [])
+    except Exception as e:
+        logging.error(f"Error getting all subscribers: {e}")
+        return None
+
+def build_announcement_email(announcement):
+    """Return the subject and body of an announcement email"""
+    subject = f"Ανακοίνωση: {announcement['title']}"
+    
+    body = f"""
 🌟 Νέα Ανακοίνωση από τη Βλασία! 🌟
 
 {announcement['title']}
@@ -317,26 +327,38 @@ def send_announcement_to_newsletter(announcement):
 Η ομάδα της Βλασίας
 🌿 vlasia.gr 🌿
 """
-            
-            # Send email using Gmail SMTP
-            if send_email(subscriber['email'], subject, body):
-                logging.info(f"✅ Announcement sent to {subscriber['email']}")
-            else:
-                logging.error(f"❌ Failed to send announcement to {subscriber['email']}")
-            
-            time.sleep(1)  # Small delay between emails
-        
-        logging.info(f"✅ Announcement '{announcement['title']}' sent to {len(subscribers)} subscribers")
-        return True
-        
-    except Exception as e:
-        logging.error(f"❌ Error sending announcement to newsletter: {e}")
+    return subject, body
+
+def deliver_welcome_email(subscriber):
+    """Send a welcome email and record it on the server (one uninterruptible unit)"""
+    logging.info(f"📨 Sending welcome email to: {subscriber['email']}")
+    if not send_welcome_newsletter(subscriber['email']):
+        return False
+    mark_newsletter_sent(subscriber['id'])
+    return True
+
+def deliver_contact_notification(contact):
+    """Send a contact notification and record it on the server (one uninterruptible unit)"""
+    logging.info(f"📨 Sending contact notification for: {contact['email']}")
+    if not send_contact_notification(contact):
         return False
+    mark_contact_notification_sent(contact['id'])
+    return True
+
+def deliver_announcement(subscriber, subject, body):
+    """Send one announcement email"""
+    if send_email(subscriber['email'], subject, body, limiter=announcement_rate_limiter):
+        logging.info(f"✅ Announcement sent to {subscriber['email']}")
+        return True
+    
+    logging.error(f"❌ Failed to send announcement to {subscriber['email']}")
+    return False
 
-def mark_announcement_sent(announcement_id):
-    """Mark announcement as sent (update server)"""
+def mark_announcement_sent(announcement_id, sent_count=None, failed_count=0):
+    """Mark announcement as sent (update server), reporting the delivery counts if known"""
     try:
-        response = requests.post(f"{SERVER_URL}/api/mark_announcement_sent/{announcement_id}")
+        payload = {'sent_count': sent_count, 'failed_count': failed_count} if sent_count is not None else None
+        response = requests.post(f"{SERVER_URL}/api/mark_announcement_sent/{announcement_id}", json=payload)
         if response.status_code == 200:
             data = response.json()
             if data.get('success'):
@@ -352,32 +374,109 @@ def mark_announcement_sent(announcement_id):
         logging.error(f"❌ Error marking announcement as sent: {e}")
         return False
 
-def main():
-    """Main function to process pending emails"""
-    logging.info("🚀 Starting Automated Email Sender for Vlasia Blog...")
-    logging.info(f"📧 Using Gmail: {GMAIL_USER}")
-    logging.info(f"🌐 Server: {SERVER_URL}")
-    logging.info("-" * 50)
+class EmailRuntime:
+    """Runs the blocking HTTP and SMTP calls of the pipelines on a bounded I/O pool
+    
+    Every pipeline has its own slots (lanes) and the pool has a thread for
+    each slot, so a busy pipeline never delays the others.
+    """
+    
+    def __init__(self, lanes):
+        """lanes maps pipeline name -> blocking calls it may have in flight"""
+        self.lanes = dict(lanes)
+        self.budgets = {lane: asyncio.Semaphore(concurrency) for lane, concurrency in self.lanes.items()}
+        self.executor = ThreadPoolExecutor(max_workers=sum(self.lanes.values()), thread_name_prefix='email-io')
+    
+    async def call(self, lane, func, *args):
+        """Await a blocking call in the lane's slots without holding up the event loop
+        
+        If the awaiting task is cancelled, a call that already started still
+        runs to completion on its thread, so a send is never separated from
+        the server update that follows it.
+        """
+        async with self.budgets[lane]:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+    
+    async def fan_out(self, lane, func, items, *args):
+        """Run func(item, *args) for every item with one worker per lane slot; returns the results in order
+        
+        Only the workers' calls exist at any time, rather than one pending
+        call per item.
+        """
+        results = [None] * len(items)
+        work = iter(enumerate(items))
+        
+        async def worker():
+            for index, item in work:
+                results[index] = await self.call(lane, func, item, *args)
+        
+        await asyncio.gather(*(worker() for _ in range(min(self.lanes[lane], len(items)))))
+        return results
     
-    # Process newsletter subscribers (welcome emails - only once)
-    logging.info("📬 Processing newsletter subscribers...")
-    subscribers = get_pending_newsletter_subscribers()
+    async def close(self):
+        """Wait for in-flight calls, drop queued ones and close the SMTP sessions, off the event loop"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, functools.partial(self.executor.shutdown, wait=True, cancel_futures=True))
+        await loop.run_in_executor(None, close_smtp_sessions)
+
+async def process_welcome_emails(runtime):
+    """Process newsletter subscribers (welcome emails - only once)"""
+    subscribers = await runtime.call('welcome', get_pending_newsletter_subscribers)
+    results = await runtime.fan_out('welcome', deliver_welcome_email, subscribers)
+    return sum(results)
+
+async def process_contact_notifications(runtime):
+    """Process contact notifications (only unsent ones)"""
+    contacts = await runtime.call('contacts', get_pending_contact_messages)
+    contacts = [contact for contact in contacts if not contact.get('notification_sent', False)]
+    results = await runtime.fan_out('contacts', deliver_contact_notification, contacts)
+    return sum(results)
+
+async def process_announcements(runtime):
+    """Process announcements (only unsent ones)
     
-    subscriber_count = 0
-    for subscriber in subscribers:
-        logging.info(f"📨 Sending welcome email to: {subscriber['email']}")
-        if send_welcome_newsletter(subscriber['email']):
-            mark_newsletter_sent(subscriber['id'])
-            subscriber_count += 1
-        time.sleep(1)  # Small delay between emails
+    The site lists pending announcements by priority and age; the list is
+    fetched again after every announcement, so one published meanwhile with
+    a higher priority goes out next instead of waiting behind the rest.
+    """
+    announcement_count = 0
+    handled = set()
     
-    # Process contact notifications (only once)
-    logging.info("📝 Processing contact notifications...")
-    contact_count = process_contact_notifications()
+    while True:
+        announcements = await runtime.call('announcements', get_pending_announcements)
+        announcement = next((a for a in announcements if a['id'] not in handled), None)
+        if announcement is None:
+            break
+        handled.add(announcement['id'])
+        
+        logging.info(f"📢 Sending announcement: {announcement['title']}")
+        subscribers = await runtime.call('announcements', get_all_newsletter_subscribers, announcement.get('category'))
+        if subscribers is None:
+            continue
+        
+        sent_count = 0
+        if not subscribers:
+            logging.warning("No newsletter subscribers found")
+        else:
+            subject, body = build_announcement_email(announcement)
+            results = await runtime.fan_out('announcements', deliver_announcement, subscribers, subject, body)
+            sent_count = sum(1 for delivered in results if delivered)
+            logging.info(f"✅ Announcement '{announcement['title']}' sent to {sent_count}/{len(subscribers)} subscribers")
+        
+        # Mark as sent
+        await runtime.call('announcements', mark_announcement_sent, announcement['id'], sent_count, len(subscribers) - sent_count)
+        announcement_count += 1
     
-    # Process announcements (only once)
-    logging.info("📢 Processing announcements...")
-    announcement_count = process_announcements()
+    return announcement_count
+
+async def run_pipelines(runtime):
+    """Run the three email pipelines concurrently; returns the cron exit code"""
+    logging.info("📬 Processing newsletter subscribers, contact notifications and announcements...")
+    subscriber_count, contact_count, announcement_count = await asyncio.gather(
+        process_welcome_emails(runtime),
+        process_contact_notifications(runtime),
+        process_announcements(runtime)
+    )
     
     logging.info("✅ Email processing completed!")
     logging.info(f"📊 Processed {contact_count} contact notifications")
@@ -390,11 +489,57 @@ def main():
     else:
         return 1  # No emails to process
 
+async def run_daemon(runtime):
+    """Daemon mode: run the pipelines whenever the server reports new work"""
+    logging.info("👂 Running in daemon mode, waiting for new work...")
+    
+    token = None
+    while True:
+        data = await runtime.call('wait', wait_for_work, token)
+        if data is None:
+            await asyncio.sleep(30)  # Back off before polling again
+            continue
+        
+        if data.get('since') != token:
+            token = data.get('since')
+            await run_pipelines(runtime)
+
+async def main_async(daemon=False):
+    """Process pending emails once, or keep processing them in daemon mode"""
+    logging.info("🚀 Starting Automated Email Sender for Vlasia Blog...")
+    logging.info(f"📧 Using Gmail: {GMAIL_USER}")
+    logging.info(f"🌐 Server: {SERVER_URL}")
+    logging.info("-" * 50)
+    
+    # Stop cleanly on Ctrl+C / SIGTERM: cancel the pipelines, then let in-flight sends finish
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, main_task.cancel)
+        except NotImplementedError:
+            pass  # Signal handlers are not available on Windows
+    
+    runtime = EmailRuntime(PIPELINE_CONCURRENCY)
+    try:
+        if daemon:
+            return await run_daemon(runtime)
+        return await run_pipelines(runtime)
+    except asyncio.CancelledError:
+        logging.info("🛑 Shutdown requested, finishing emails already in flight...")
+        raise
+    finally:
+        await runtime.close()
+
+def main():
+    """Main function to process pending emails"""
+    return asyncio.run(main_async(daemon='--daemon' in sys.argv[1:]))
+
 if __name__ == "__main__":
     try:
         exit_code = main()
         sys.exit(exit_code)
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logging.info("🛑 Script interrupted by user")
         sys.exit(1)
     except Exception as e:
@@ -0,0 +1,199 @@
+"""
+Chunked, resumable uploads for large media
+A client announces a file (name, size, optional SHA-256), then sends it in
+chunks, each at the offset the server reports. Chunks are streamed straight
+to a partial file on disk, so memory use doesn't grow with the file, and a
+broken upload resumes from the last byte that arrived. Once complete, the
+file is moved into the upload folder under a unique name for the admin
+model to use.
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+
+from werkzeug.utils import secure_filename
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent writes to one upload are not guarded
+    fcntl = None
+
+PARTIAL_FOLDER = '.partial'
+STREAM_BLOCK_SIZE = 64 * 1024
+STALE_AFTER = 24 * 60 * 60  # seconds before an abandoned upload is removed
+
+
+class UploadError(Exception):
+    """Rejected upload request; status is the HTTP status to answer with"""
+    status = 400
+
+    def __init__(self, message, offset=None):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadNotFound(UploadError):
+    status = 404
+
+
+class UploadConflict(UploadError):
+    """The chunk doesn't start where the upload stands (or another chunk is being written)"""
+    status = 409
+
+
+class ChunkedUploads:
+    def __init__(self, upload_folder, max_size, allowed_extensions):
+        """max_size is the largest accepted file in bytes"""
+        self.upload_folder = upload_folder
+        self.partial_folder = os.path.join(upload_folder, PARTIAL_FOLDER)
+        self.max_size = max_size
+        self.allowed_extensions = {extension.lower() for extension in allowed_extensions}
+
+    def _paths(self, upload_id):
+        if len(upload_id) != 32 or any(c not in '0123456789abcdef' for c in upload_id):
+            raise UploadNotFound('Unknown upload')
+        base = os.path.join(self.partial_folder, upload_id)
+        return base + '.json', base + '.part'
+
+    def _load(self, upload_id):
+        info_path, part_path = self._paths(upload_id)
+        try:
+            with open(info_path, encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            raise UploadNotFound('Unknown upload')
+        return info, part_path
+
+    def _save(self, upload_id, info):
+        info_path, _ = self._paths(upload_id)
+        with open(info_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(info, f)
+        os.replace(info_path + '.tmp', info_path)
+
+    def _status(self, upload_id, info, part_path):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        return {
+            'upload_id': upload_id,
+            'filename': info['filename'],
+            'size': info['size'],
+            'offset': offset,
+            'complete': info.get('complete', False),
+        }
+
+    def create(self, filename, size, sha256=None):
+        """Start an upload and return its status"""
+        filename = secure_filename(filename or '')
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if extension not in self.allowed_extensions:
+            raise UploadError('File type not allowed')
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('Invalid file size')
+        if size > self.max_size:
+            raise UploadError(f'File larger than {self.max_size} bytes')
+        if sha256 is not None and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256.lower())):
+            raise UploadError('Invalid SHA-256 checksum')
+
+        os.makedirs(self.partial_folder, exist_ok=True)
+        self.prune()
+
+        upload_id = uuid.uuid4().hex
+        info = {'filename': filename, 'size': size, 'sha256': sha256.lower() if sha256 else None}
+        _, part_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        self._save(upload_id, info)
+        return self._status(upload_id, info, part_path)
+
+    def status(self, upload_id):
+        info, part_path = self._load(upload_id)
+        return self._status(upload_id, info, part_path)
+
+    def write_chunk(self, upload_id, offset, stream, length, sha256=None):
+        """Append length bytes read from stream at offset; returns the new status
+
+        A chunk sent with a checksum is kept only if it arrived whole and
+        matches; one without is kept as far as it got, to resume from there.
+        When the last byte arrives the whole file is checked against the
+        checksum given at creation.
+        """
+        info, part_path = self._load(upload_id)
+        if info.get('complete'):
+            raise UploadConflict('Upload already complete', offset=info['size'])
+
+        with open(part_path, 'r+b') as f:
+            if fcntl:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadConflict('Another chunk is being written')
+
+            current = f.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadConflict('Chunk does not start at the upload offset', offset=current)
+            if length is None or length <= 0 or current + length > info['size']:
+                raise UploadError('Invalid chunk length', offset=current)
+
+            digest = hashlib.sha256()
+            remaining = length
+            while remaining:
+                block = stream.read(min(STREAM_BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                f.write(block)
+                digest.update(block)
+                remaining -= len(block)
+
+            if sha256 and (remaining or digest.hexdigest() != sha256.lower()):
+                f.truncate(current)
+                raise UploadError('Chunk checksum mismatch', offset=current)
+            f.flush()
+            os.fsync(f.fileno())
+            offset = f.tell()
+
+        if offset == info['size']:
+            if info.get('sha256') and file_sha256(part_path) != info['sha256']:
+                self.discard(upload_id)
+                raise UploadError('File checksum mismatch, upload discarded', offset=0)
+            info['complete'] = True
+            self._save(upload_id, info)
+
+        return self._status(upload_id, info, part_path)
+
+    def finish(self, upload_id):
+        """Move a complete upload into the upload folder and return its stored filename"""
+        info, part_path = self._load(upload_id)
+        if not info.get('complete'):
+            raise UploadConflict('Upload is not complete', offset=self._status(upload_id, info, part_path)['offset'])
+
+        stored_filename = f"{upload_id}_{info['filename']}"
+        os.replace(part_path, os.path.join(self.upload_folder, stored_filename))
+        os.remove(self._paths(upload_id)[0])
+        return stored_filename
+
+    def discard(self, upload_id):
+        for path in self._paths(upload_id):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def prune(self, max_age=STALE_AFTER):
+        """Remove uploads that saw no chunk for max_age seconds and were never used"""
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.partial_folder):
+            if not name.endswith('.json'):
+                continue
+            try:
+                paths = self._paths(name[:-len('.json')])
+                if max(os.path.getmtime(path) for path in paths if os.path.exists(path)) < cutoff:
+                    self.discard(name[:-len('.json')])
+            except (UploadError, OSError, ValueError):
+                pass  # Not ours, or finished by another worker meanwhile
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(STREAM_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
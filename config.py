@@ -9,7 +9,27 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-production')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = 'static/uploads'
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max request size
+    
+    # Admin media go through the chunked upload endpoint, so files can be larger than one request
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', 2 * 1024 * 1024 * 1024))  # bytes
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # bytes per request, below MAX_CONTENT_LENGTH
+    
+    # Rendered-page cache for the public routes (PAGE_CACHE_TTL=0 turns it off)
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))  # seconds
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 256))
+    # How long a worker reuses the content versions its cached pages are checked against;
+    # edits made through another worker show up after at most this long
+    CONTENT_VERSION_TTL = int(os.environ.get('CONTENT_VERSION_TTL', 5))  # seconds
+    
+    # Background job worker threads per process (0 = run them with `flask run-jobs` instead)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    
+    # Announcement delivery order: relative throughput per priority, priorities that
+    # pre-empt everything else, and hours of waiting that promote one priority level
+    DISPATCH_PRIORITY_SHARES = os.environ.get('DISPATCH_PRIORITY_SHARES', 'urgent=8,high=4,normal=2,low=1')
+    DISPATCH_PREEMPTIVE_PRIORITIES = os.environ.get('DISPATCH_PREEMPTIVE_PRIORITIES', 'urgent')
+    DISPATCH_AGING_HOURS = float(os.environ.get('DISPATCH_AGING_HOURS', 24))
     
     # Email configuration for Flask-Mail
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -0,0 +1,115 @@
+"""
+Priority-aware ordering of pending announcement deliveries
+Work is handed out one recipient batch at a time. Announcements of a
+pre-emptive priority ('urgent') are served exclusively while any is pending,
+so they take over from a running fan-out at the next batch boundary. The
+other priorities share the throughput in proportion to their configured
+shares (stride scheduling over the recipients served), and inside a
+priority the oldest announcement goes first. allocate() instead splits one
+page over all pending work, for mailers that send it side by side.
+Announcements that wait long are promoted one priority level per aging
+interval, so low ones can't starve. Like PageCache, each worker process
+keeps its own accounting.
+"""
+
+import threading
+from datetime import datetime
+
+PRIORITIES = ['low', 'normal', 'high', 'urgent']  # lowest first
+DEFAULT_SHARES = {'urgent': 8, 'high': 4, 'normal': 2, 'low': 1}
+DEFAULT_PRIORITY = 'normal'
+
+
+def parse_shares(value, default=DEFAULT_SHARES):
+    """'urgent=8,high=4,normal=2,low=1' -> {'urgent': 8.0, ...}; missing priorities keep their default"""
+    shares = {priority: float(share) for priority, share in default.items()}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        priority, _, share = item.partition('=')
+        if priority.strip() in PRIORITIES and float(share) > 0:
+            shares[priority.strip()] = float(share)
+    return shares
+
+
+class DispatchScheduler:
+    def __init__(self, shares=None, preemptive=('urgent',), aging_hours=24):
+        """shares maps priority -> relative throughput; aging_hours=0 disables promotion"""
+        self.shares = dict(shares or DEFAULT_SHARES)
+        self.preemptive = set(preemptive)
+        self.aging_hours = aging_hours
+        self._passes = {}  # priority -> recipients served / share (stride "pass" value)
+        self._lock = threading.Lock()
+
+    def effective_priority(self, priority, created_at, now=None):
+        """The priority after aging; never promotes into a pre-emptive priority"""
+        if priority not in PRIORITIES:
+            priority = DEFAULT_PRIORITY
+        if priority in self.preemptive or not self.aging_hours or created_at is None:
+            return priority
+
+        level = PRIORITIES.index(priority)
+        age_hours = ((now or datetime.utcnow()) - created_at).total_seconds() / 3600
+        promoted = min(level + int(age_hours // self.aging_hours), len(PRIORITIES) - 1)
+        while promoted > level and PRIORITIES[promoted] in self.preemptive:
+            promoted -= 1
+        return PRIORITIES[promoted]
+
+    def order(self, pending, now=None):
+        """Sort pending work, best candidate first
+
+        pending is a list of (key, priority, created_at); returns the keys.
+        Pre-emptive priorities come first (highest, then oldest), then the
+        shared priorities by their stride pass, oldest first within one.
+        """
+        now = now or datetime.utcnow()
+        items = [(key, self.effective_priority(priority, created_at, now), created_at or now)
+                 for key, priority, created_at in pending]
+
+        with self._lock:
+            # A priority that had nothing pending starts level with the busiest one,
+            # instead of claiming all the throughput it "missed"
+            active = {priority for _, priority, _ in items}
+            floor = min((self._passes[p] for p in active if p in self._passes), default=0.0)
+            for priority in active:
+                self._passes.setdefault(priority, floor)
+            for priority in list(self._passes):
+                if priority not in active:
+                    del self._passes[priority]
+
+            def sort_key(item):
+                _, priority, created_at = item
+                if priority in self.preemptive:
+                    return (0, -PRIORITIES.index(priority), 0.0, created_at)
+                return (1, 0, self._passes[priority], -PRIORITIES.index(priority), created_at)
+
+            return [key for key, _, _ in sorted(items, key=sort_key)]
+
+    def charge(self, priority, created_at, recipients, now=None):
+        """Account for a batch of recipients served for work of this priority"""
+        priority = self.effective_priority(priority, created_at, now)
+        if priority in self.preemptive or not recipients:
+            return
+        with self._lock:
+            self._passes[priority] = self._passes.get(priority, 0.0) + recipients / self.shares.get(priority, 1.0)
+
+    def allocate(self, pending, budget, now=None):
+        """Split a page of budget recipients over pending work sent side by side
+
+        Returns tiers of (key, limit) pairs, to be tried in order: one per
+        pre-emptive priority (highest first), then all the other work. The
+        first tier with anything left to send is served on its own; inside a
+        tier every item gets a share of the budget weighted by its priority.
+        """
+        now = now or datetime.utcnow()
+        priorities = {key: self.effective_priority(priority, created_at, now) for key, priority, created_at in pending}
+        order = self.order(pending, now)
+
+        tiers = [[key for key in order if priorities[key] == priority]
+                 for priority in reversed(PRIORITIES) if priority in self.preemptive]
+        tiers.append([key for key in order if priorities[key] not in self.preemptive])
+
+        allocation = []
+        for keys in filter(None, tiers):
+            weights = [self.shares.get(priorities[key], 1.0) for key in keys]
+            allocation.append([(key, max(1, int(budget * weight / sum(weights))))
+                               for key, weight in zip(keys, weights)])
+        return allocation
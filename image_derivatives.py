@@ -0,0 +1,87 @@
+"""
+Resized and WebP copies of uploaded images
+For every upload a thumbnail, a medium and a full-size rendition are written
+next to the original, each in the original format and as WebP. The returned
+description (with the dimensions of every file) is stored on the model and
+used by the templates to emit srcset attributes.
+"""
+
+import json
+import os
+
+from PIL import Image, ImageOps
+
+# Rendition name -> maximum width in pixels
+DERIVATIVE_WIDTHS = {
+    'thumb': 320,
+    'medium': 800,
+    'full': 1600,
+}
+
+# Formats we re-encode; anything else (e.g. animated GIFs) is served as uploaded
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 82, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+}
+WEBP_OPTIONS = {'quality': 80, 'method': 4}
+
+
+def derivative_filename(filename, name, extension=None):
+    """photo.jpg -> photo_thumb.jpg (or photo_thumb.webp with extension='.webp')"""
+    stem, original_extension = os.path.splitext(filename)
+    return f"{stem}_{name}{extension or original_extension.lower()}"
+
+
+def generate_derivatives(upload_folder, filename):
+    """Write the renditions of one upload and return their description
+
+    Images we don't re-encode get a description without variants. The
+    description looks like {"width": 3000, "height": 2000, "variants":
+    [{"name": "thumb", "width": 320, "height": 213, "file": ..., "webp": ...}, ...]}.
+    """
+    path = os.path.join(upload_folder, filename)
+    with Image.open(path) as original:
+        image_format = original.format
+        if image_format not in SAVE_OPTIONS:
+            return {'width': original.width, 'height': original.height, 'variants': []}
+
+        image = ImageOps.exif_transpose(original)
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        width, height = image.size
+
+        variants = []
+        for name, max_width in sorted(DERIVATIVE_WIDTHS.items(), key=lambda item: item[1]):
+            target_width = min(max_width, width)
+            if variants and variants[-1]['width'] == target_width:
+                continue  # The original is narrower than this rendition
+
+            target_height = max(1, round(height * target_width / width))
+            resized = image if target_width == width else image.resize((target_width, target_height), Image.LANCZOS)
+
+            variant_file = derivative_filename(filename, name)
+            webp_file = derivative_filename(filename, name, '.webp')
+            resized.save(os.path.join(upload_folder, variant_file), image_format, **SAVE_OPTIONS[image_format])
+            resized.save(os.path.join(upload_folder, webp_file), 'WEBP', **WEBP_OPTIONS)
+
+            variants.append({
+                'name': name,
+                'width': target_width,
+                'height': target_height,
+                'file': variant_file,
+                'webp': webp_file,
+            })
+
+    return {'width': width, 'height': height, 'variants': variants}
+
+
+def load_description(description):
+    """Accept a description as stored on the model (JSON text) or already parsed"""
+    if not description:
+        return {}
+    if isinstance(description, str):
+        try:
+            return json.loads(description)
+        except ValueError:
+            return {}
+    return description
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Buffered delivery acknowledgements for the newsletter mailer
+Collects (user_id, announcement_id, status) records and hands them to the
+site in batches, flushed by size or by age, instead of one request per email.
+While the site can't take them, records are kept and retried from the
+background thread with a growing delay, so sending never waits on it.
+"""
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AckBuffer:
+    def __init__(self, flush_func, max_size=200, max_delay=5.0, retry_delay=5.0, max_retry_delay=300.0):
+        """flush_func receives a list of records and returns True once they are stored"""
+        self.flush_func = flush_func
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+        self._records = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._timer = None
+        self._backoff = 0  # Current retry delay, 0 while flushes succeed
+        self._retry_at = None  # Set after a failed flush; until then only the timer flushes
+
+        self.acked_count = 0
+
+    def start(self):
+        """Start the background thread that flushes records older than max_delay"""
+        if self._timer is not None:
+            return
+        self._stop.clear()
+        self._timer = threading.Thread(target=self._flush_periodically, name='ack-flusher', daemon=True)
+        self._timer.start()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.max_delay / 2):
+            with self._lock:
+                now = time.monotonic()
+                if self._retry_at is not None:
+                    due = now >= self._retry_at
+                else:
+                    due = self._oldest is not None and now - self._oldest >= self.max_delay
+            if due:
+                self.flush()
+
+    def add(self, record):
+        """Queue one acknowledgement, flushing if the buffer is full and the site is reachable"""
+        with self._lock:
+            if not self._records:
+                self._oldest = time.monotonic()
+            self._records.append(record)
+            full = len(self._records) >= self.max_size and self._retry_at is None
+
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Send every buffered record; on failure they stay queued and are retried after a backoff"""
+        with self._flush_lock:
+            with self._lock:
+                records, self._records = self._records, []
+                self._oldest = None
+
+            if not records:
+                return True
+
+            try:
+                stored = self.flush_func(records)
+            except Exception as e:
+                logger.error(f"Error flushing {len(records)} acknowledgements: {e}")
+                stored = False
+
+            if stored:
+                self.acked_count += len(records)
+                with self._lock:
+                    self._backoff = 0
+                    self._retry_at = None
+                return True
+
+            with self._lock:
+                self._records = records + self._records
+                self._oldest = time.monotonic()
+                self._backoff = min(max(self._backoff * 2, self.retry_delay), self.max_retry_delay)
+                self._retry_at = self._oldest + self._backoff
+            logger.info(f"⏳ Retrying acknowledgements in {self._backoff:.0f}s")
+            return False
+
+    def close(self):
+        """Stop the background flusher and flush what is left
+
+        Returns the number of sent emails whose acknowledgement could not be
+        delivered; 'failed' records left over are not counted.
+        """
+        self._stop.set()
+        if self._timer is not None:
+            self._timer.join()
+            self._timer = None
+
+        self.flush()
+        with self._lock:
+            unacked = sum(1 for record in self._records if record.get('status', 'sent') == 'sent')
+            self._records = []
+            self._oldest = None
+        return unacked
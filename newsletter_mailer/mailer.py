@@ -5,14 +5,23 @@ This script runs independently to send newsletter emails via external SMTP
 """
 
 import os
+import sys
+import signal
 import requests
-import smtplib
 import logging
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
 from datetime import datetime
 import json
 
+from smtp_session import SMTPSession
+from ack_buffer import AckBuffer
+from message_cache import MessageCache, MessageTemplate
+from rate_limiter import AdaptiveRateLimiter
+from outbox import Outbox
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -30,7 +39,10 @@ class NewsletterMailer:
         # API Configuration
         self.api_url_get_emails = os.getenv('API_URL_GET_EMAILS')
         self.api_url_mark_sent = os.getenv('API_URL_MARK_SENT')
+        self.api_url_mark_sent_batch = os.getenv('API_URL_MARK_SENT_BATCH') or f"{self.api_url_mark_sent}-batch"
         self.api_secret_key = os.getenv('API_SECRET_KEY')
+        self.api_url_wait_for_work = os.getenv('API_URL_WAIT_FOR_WORK') or \
+            (self.api_url_get_emails or '').replace('get-newsletter-batch', 'wait-for-work')
         
         # SMTP Configuration
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
@@ -38,9 +50,51 @@ class NewsletterMailer:
         self.smtp_username = os.getenv('SMTP_USERNAME')
         self.smtp_password = os.getenv('SMTP_PASSWORD')
         self.sender_email = os.getenv('SENDER_EMAIL')
+        self.smtp_max_messages = int(os.getenv('SMTP_MAX_MESSAGES_PER_SESSION', '100'))
+        self.smtp_noop_interval = int(os.getenv('SMTP_NOOP_INTERVAL', '30'))
+        
+        # Send engine configuration
+        self.concurrency = max(1, int(os.getenv('MAILER_CONCURRENCY', '1')))
+        self.rate_per_connection = float(os.getenv('MAILER_RATE_PER_CONNECTION', '0'))
+        self.send_rate = float(os.getenv('MAILER_RATE', '0'))  # 0 = unlimited until the relay pushes back
+        self.send_rate_max = float(os.getenv('MAILER_RATE_MAX', '20'))
+        self.send_burst = int(os.getenv('MAILER_BURST', '5'))
+        self.ack_batch_size = int(os.getenv('MAILER_ACK_BATCH_SIZE', '200'))
+        self.ack_max_delay = float(os.getenv('MAILER_ACK_MAX_DELAY', '5'))
+        self.page_size = int(os.getenv('MAILER_PAGE_SIZE', '500'))
+        self.outbox_path = os.getenv('MAILER_OUTBOX_PATH', 'newsletter_outbox.db')
+        self.max_attempts = int(os.getenv('MAILER_MAX_ATTEMPTS', '3'))
+        self.wait_timeout = int(os.getenv('MAILER_WAIT_TIMEOUT', '20'))
+        self.retry_delay = float(os.getenv('MAILER_RETRY_DELAY', '60'))  # daemon: first rerun for left-over recipients
+        self.retry_max_delay = float(os.getenv('MAILER_RETRY_MAX_DELAY', '900'))
         
         # Validate configuration
         self._validate_config()
+        
+        # One authenticated SMTP session per sending thread, reused for the whole batch
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+        
+        # Global send budget shared by every SMTP session, adapted to the relay's replies
+        self.rate_limiter = AdaptiveRateLimiter(
+            rate=self.send_rate,
+            burst=self.send_burst,
+            max_rate=self.send_rate_max
+        )
+        
+        # Rendered message bodies, one per announcement
+        self.messages = MessageCache()
+        
+        # Delivery acknowledgements are sent to the site in batches
+        self.acks = AckBuffer(self._store_acks, max_size=self.ack_batch_size, max_delay=self.ack_max_delay)
+        self.unacked_count = 0
+        
+        # Local checkpoint of every recipient's state, so interrupted runs can resume
+        self.outbox = Outbox(self.outbox_path)
+        
+        # Set to stop daemon mode after the current run
+        self.stop_event = threading.Event()
     
     def _validate_config(self):
         """Validate that all required configuration is present"""
@@ -61,16 +115,48 @@ class NewsletterMailer:
         if missing_vars:
             raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
     
-    def get_newsletter_data(self):
-        """Fetch newsletter data from the site API"""
+    def _get_smtp_session(self):
+        """Return the SMTP session owned by the current thread, creating it on first use"""
+        session = getattr(self._local, 'smtp', None)
+        if session is None:
+            session = SMTPSession(
+                self.smtp_server,
+                self.smtp_port,
+                self.smtp_username,
+                self.smtp_password,
+                max_messages=self.smtp_max_messages,
+                noop_interval=self.smtp_noop_interval,
+                rate=self.rate_per_connection,
+                on_pushback=self.rate_limiter.record
+            )
+            self._local.smtp = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+    
+    def _close_smtp_sessions(self):
+        """Close every SMTP session opened by the send threads"""
+        with self._sessions_lock:
+            sessions, self._sessions = self._sessions, []
+            self._local = threading.local()
+        
+        for session in sessions:
+            session.close()
+    
+    def get_newsletter_data(self, after_user_id=0, announcement_id=None):
+        """Fetch one page of newsletter data from the site API"""
         try:
             headers = {
                 'Authorization': f'Bearer {self.api_secret_key}',
                 'Content-Type': 'application/json'
             }
             
-            logger.info(f"Fetching newsletter data from: {self.api_url_get_emails}")
-            response = requests.get(self.api_url_get_emails, headers=headers, timeout=30)
+            params = {'after_user_id': after_user_id, 'limit': self.page_size}
+            if announcement_id:
+                params['announcement_id'] = announcement_id
+            
+            logger.info(f"Fetching newsletter data from: {self.api_url_get_emails} (after user {after_user_id})")
+            response = requests.get(self.api_url_get_emails, headers=headers, params=params, timeout=30)
             response.raise_for_status()
             
             data = response.json()
@@ -84,29 +170,80 @@ class NewsletterMailer:
             logger.error(f"Error parsing JSON response: {e}")
             return None
     
-    def send_email(self, recipient_email, subject, body_html):
-        """Send a single email via SMTP"""
+    def get_newsletter_batches(self, cursors):
+        """Fetch pages for every pending announcement at once, each from its own cursor"""
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = self.sender_email
-            msg['To'] = recipient_email
-            msg['Subject'] = subject
-            
-            # Add HTML content
-            html_part = MIMEText(body_html, 'html', 'utf-8')
-            msg.attach(html_part)
-            
-            # Connect to SMTP server
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
+            headers = {
+                'Authorization': f'Bearer {self.api_secret_key}',
+                'Content-Type': 'application/json'
+            }
+            
+            params = {
+                'all': 1,
+                'limit': self.page_size,
+                'cursor': [f'{announcement_id}:{after_user_id}' for announcement_id, after_user_id in cursors.items()]
+            }
+            
+            logger.info(f"Fetching newsletter batches from: {self.api_url_get_emails} ({len(cursors)} announcements in progress)")
+            response = requests.get(self.api_url_get_emails, headers=headers, params=params, timeout=30)
+            response.raise_for_status()
+            
+            data = response.json()
+            pages = data.get('announcements', [])
+            logger.info(f"Retrieved {sum(len(page['recipients']) for page in pages)} recipients for {len(pages)} announcements")
+            return data
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error fetching newsletter batches: {e}")
+            return None
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parsing JSON response: {e}")
+            return None
+    
+    def iter_newsletter_rounds(self):
+        """Yield rounds of pages, one page per pending announcement, fetching the next round while one is sent
+        
+        Every announcement is paged through on its own cursor, so all of them
+        progress together; the site sizes each page by the announcement's priority.
+        """
+        cursors = {}
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch') as prefetch:
+            data = self.get_newsletter_batches(cursors)
+            
+            while data and data.get('announcements'):
+                for page in data['announcements']:
+                    cursors[page['announcement_id']] = page['next_after_user_id']
+                
+                next_round = None
+                if data.get('has_more'):
+                    next_round = prefetch.submit(self.get_newsletter_batches, dict(cursors))
                 
-                # Send email
-                server.send_message(msg)
-                logger.info(f"Email sent successfully to: {recipient_email}")
-                return True
+                yield data['announcements']
+                
+                if next_round is None:
+                    break
+                data = next_round.result()
+    
+    def send_email(self, recipient_email, subject, body_html, announcement_id=None, message_id=None):
+        """Send a single email via SMTP"""
+        try:
+            # The body is rendered once per announcement; only the envelope changes per recipient
+            cache_key = announcement_id if announcement_id is not None else (subject, body_html)
+            template = self.messages.get(
+                cache_key,
+                lambda: MessageTemplate(self.sender_email, subject, body_html)
+            )
+            msg = template.render(recipient_email, message_id)
+            
+            # Send over this thread's session (reconnects transparently if needed)
+            self.rate_limiter.acquire()
+            self._get_smtp_session().sendmail(self.sender_email, [recipient_email], msg)
+            self.rate_limiter.record()
+            logger.info(f"Email sent successfully to: {recipient_email}")
+            return True
                 
         except Exception as e:
+            self.rate_limiter.record(e)
             logger.error(f"Failed to send email to {recipient_email}: {e}")
             return False
     
@@ -139,56 +276,250 @@ class NewsletterMailer:
             logger.error(f"Error marking email as sent: {e}")
             return False
     
-    def run(self):
-        """Main execution method"""
-        logger.info("🚀 Starting Newsletter Mailer...")
+    def mark_emails_sent(self, records):
+        """Mark a batch of emails as sent in the site database with one request"""
+        try:
+            headers = {
+                'Authorization': f'Bearer {self.api_secret_key}',
+                'Content-Type': 'application/json'
+            }
+            
+            response = requests.post(
+                self.api_url_mark_sent_batch,
+                headers=headers,
+                json={'records': records},
+                timeout=30
+            )
+            response.raise_for_status()
+            
+            logger.info(f"Marked {len(records)} emails as sent")
+            return True
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error marking {len(records)} emails as sent: {e}")
+            return False
+    
+    def _store_acks(self, records):
+        """Send buffered acknowledgements to the site and checkpoint them in the outbox"""
+        if not self.mark_emails_sent(records):
+            return False
         
-        # Get newsletter data
-        data = self.get_newsletter_data()
-        if not data:
-            logger.warning("No newsletter data available. Exiting.")
-            return
+        self.outbox.mark_acked(records)
+        return True
+    
+    def _message_id(self, announcement_id, user_id):
+        """Deterministic Message-ID, so a replayed send is recognisable as the same email"""
+        domain = self.sender_email.rpartition('@')[2]
+        return f"<newsletter.{announcement_id}.{user_id}@{domain}>"
+    
+    def _process_recipient(self, recipient, data):
+        """Send to one recipient and queue its acknowledgement; returns 'sent' or 'failed'"""
+        user_id = recipient['user_id']
+        email = recipient['email']
         
-        if not data.get('recipients'):
-            logger.info("No recipients found. Exiting.")
-            return
+        logger.info(f"Processing recipient {user_id}: {email}")
         
-        # Send emails to each recipient
-        success_count = 0
-        total_count = len(data['recipients'])
+        announcement_id = data['announcement_id']
         
-        for recipient in data['recipients']:
-            user_id = recipient['user_id']
-            email = recipient['email']
-            
-            logger.info(f"Processing recipient {user_id}: {email}")
-            
-            # Send email
-            if self.send_email(email, data['subject'], data['body_html']):
-                # Mark as sent
-                if self.mark_email_sent(user_id, data['announcement_id']):
-                    success_count += 1
-                    logger.info(f"✅ Successfully processed: {email}")
-                else:
-                    logger.warning(f"⚠️ Email sent but failed to mark as sent: {email}")
+        # Send email
+        message_id = self._message_id(announcement_id, user_id)
+        if not self.send_email(email, data['subject'], data['body_html'], announcement_id, message_id):
+            if self.outbox.mark_attempt_failed(announcement_id, user_id, self.max_attempts):
+                # Tell the site to stop offering this recipient
+                logger.error(f"❌ Giving up on {email} after {self.max_attempts} attempts")
+                self.acks.add({
+                    'user_id': user_id,
+                    'announcement_id': announcement_id,
+                    'status': 'failed',
+                    'sent_at': datetime.utcnow().isoformat()
+                })
             else:
                 logger.error(f"❌ Failed to send email: {email}")
+            return 'failed'
+        
+        self.outbox.mark_sent(announcement_id, user_id)
+        
+        # Mark as sent (flushed to the site in batches)
+        self.acks.add({
+            'user_id': user_id,
+            'announcement_id': announcement_id,
+            'status': 'sent',
+            'sent_at': datetime.utcnow().isoformat()
+        })
+        
+        logger.info(f"✅ Successfully processed: {email}")
+        return 'sent'
+    
+    def iter_pending_rounds(self):
+        """Yield recipients left queued by an interrupted run, then fresh rounds from the site
+        
+        Fresh pages are recorded in the outbox first; recipients it already
+        knows were sent are dropped so they are never emailed twice.
+        """
+        for data in self.outbox.queued_pages(self.page_size):
+            logger.info(f"♻️ Resuming {len(data['recipients'])} queued recipients of announcement {data['announcement_id']}")
+            yield [data]
+        
+        for pages in self.iter_newsletter_rounds():
+            yield [dict(data, recipients=self.outbox.enqueue(data)) for data in pages]
+    
+    def replay_unacked(self):
+        """Queue acknowledgements for emails an earlier run sent but never reported"""
+        records = self.outbox.unacked()
+        if records:
+            logger.info(f"♻️ Replaying {len(records)} unacknowledged sends from the outbox")
+            for record in records:
+                self.acks.add(record)
+    
+    def send_round(self, pages, pool=None):
+        """Send one page of every announcement in the round, spread over the pool's SMTP sessions if given
+        
+        The announcements' recipients are interleaved, so each one advances
+        at its page's pace; the shared rate limiter keeps the total within
+        the relay's budget. Returns one status per recipient.
+        """
+        tasks = [
+            (recipient, data)
+            for batch in zip_longest(*(data['recipients'] for data in pages))
+            for recipient, data in zip(batch, pages)
+            if recipient is not None
+        ]
+        
+        if pool is None:
+            return [self._process_recipient(recipient, data) for recipient, data in tasks]
+        
+        return list(pool.map(lambda task: self._process_recipient(*task), tasks))
+    
+    def run(self):
+        """Main execution method; returns True if recipients were left for a later run"""
+        logger.info("🚀 Starting Newsletter Mailer...")
+        
+        total_count = 0
+        sent_count = 0
+        announcement_ids = set()
+        
+        pool = None
+        if self.concurrency > 1:
+            logger.info(f"📤 Sending with {self.concurrency} parallel SMTP sessions")
+            pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='smtp')
+        
+        self.acks.start()
+        try:
+            self.replay_unacked()
+            
+            # Pages are streamed from the API, so memory stays flat regardless of list size,
+            # and every pending announcement is sent in the same run
+            for pages in self.iter_pending_rounds():
+                if self.stop_event.is_set():
+                    logger.info("🛑 Stop requested, leaving the remaining recipients for the next run")
+                    break
+                results = self.send_round(pages, pool)
+                announcement_ids.update(data['announcement_id'] for data in pages)
+                total_count += len(results)
+                sent_count += results.count('sent')
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            self._close_smtp_sessions()
+            self.unacked_count = self.acks.close()
+            self.outbox.prune()
+            self.outbox.checkpoint()
+        
+        left_over = self.outbox.has_work()
+        if left_over:
+            logger.info("⏳ Some recipients are still queued or unacknowledged, they will be retried")
+        
+        if not total_count:
+            logger.info("No recipients found. Exiting.")
+            return left_over
+        
+        unacked_count = self.unacked_count
+        success_count = sent_count - unacked_count
         
         # Summary
         logger.info(f"🎯 Newsletter processing complete!")
+        logger.info(f"📢 Announcements: {len(announcement_ids)}")
         logger.info(f"📊 Total recipients: {total_count}")
         logger.info(f"✅ Successful: {success_count}")
-        logger.info(f"❌ Failed: {total_count - success_count}")
+        if unacked_count:
+            logger.info(f"⚠️ Sent but not marked: {unacked_count}")
+        logger.info(f"❌ Failed: {total_count - sent_count}")
+        return left_over
+
+    def wait_for_work(self, since=None):
+        """Long-poll the site until there is new work; returns the new work token"""
+        try:
+            headers = {
+                'Authorization': f'Bearer {self.api_secret_key}',
+                'Content-Type': 'application/json'
+            }
+            
+            params = {'timeout': self.wait_timeout}
+            if since:
+                params['since'] = since
+            
+            response = requests.get(
+                self.api_url_wait_for_work,
+                headers=headers,
+                params=params,
+                timeout=self.wait_timeout + 15
+            )
+            response.raise_for_status()
+            
+            data = response.json()
+            if data.get('changed'):
+                logger.info(f"🔔 New work available: {data.get('pending')}")
+            return data.get('since', since)
+            
+        except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
+            logger.error(f"Error waiting for work: {e}")
+            self.stop_event.wait(30)  # Back off before polling again
+            return since
+    
+    def run_forever(self):
+        """Daemon mode: send whenever the site reports new work, until stopped
+        
+        A run that leaves recipients behind (transient failures, a stop
+        part-way, acknowledgements the site didn't take) is repeated with
+        exponential backoff, even if no new work arrives meanwhile.
+        """
+        logger.info("👂 Newsletter Mailer running in daemon mode")
+        
+        token = None
+        retry_at = None
+        delay = self.retry_delay
+        while not self.stop_event.is_set():
+            new_token = self.wait_for_work(token)
+            if self.stop_event.is_set():
+                break
+            
+            retry_due = retry_at is not None and time.monotonic() >= retry_at
+            if new_token != token or retry_due:
+                token = new_token
+                if self.run():
+                    retry_at = time.monotonic() + delay
+                    logger.info(f"🔁 Retrying left-over recipients in {delay:.0f}s")
+                    delay = min(delay * 2, self.retry_max_delay)
+                else:
+                    retry_at, delay = None, self.retry_delay
+        
+        logger.info("🛑 Newsletter Mailer daemon stopped")
 
 def main():
     """Main entry point"""
     try:
         mailer = NewsletterMailer()
-        mailer.run()
+        
+        if '--daemon' in sys.argv[1:] or os.getenv('MAILER_DAEMON', '').lower() in ('1', 'true', 'yes'):
+            # Finish the current run, then exit, on Ctrl+C / SIGTERM
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda signum, frame: mailer.stop_event.set())
+            mailer.run_forever()
+        else:
+            mailer.run()
     except Exception as e:
         logger.error(f"Fatal error: {e}")
         exit(1)
 
 if __name__ == "__main__":
     main()
-
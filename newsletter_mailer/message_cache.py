@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Pre-rendered message templates for bulk sends
+The MIME body of an announcement is built and encoded once; each recipient's
+copy is produced by stamping the To, Message-ID and Date headers onto the cached bytes
+"""
+
+import threading
+from collections import OrderedDict
+from email import policy
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.utils import formatdate, make_msgid
+
+
+class MessageTemplate:
+    def __init__(self, sender, subject, body, subtype='html', multipart='alternative'):
+        """Render the shared part of the message once"""
+        msg = MIMEMultipart(multipart)
+        msg['From'] = sender
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, subtype, 'utf-8'))
+
+        # CRLF line endings, since smtplib sends bytes as they are
+        headers, _, encoded_body = msg.as_bytes(policy=policy.compat32.clone(linesep='\r\n')).partition(b'\r\n\r\n')
+        self.sender = sender
+        self._headers = headers + b'\r\n'
+        self._body = b'\r\n' + encoded_body
+        self._domain = sender.rpartition('@')[2] or None
+
+    def render(self, recipient, message_id=None):
+        """Return the serialized message for one recipient"""
+        if '\r' in recipient or '\n' in recipient:
+            raise ValueError(f"Invalid recipient address: {recipient!r}")
+
+        message_id = message_id or make_msgid(domain=self._domain)
+        envelope = f"To: {recipient}\r\nMessage-ID: {message_id}\r\nDate: {formatdate(localtime=True)}\r\n".encode('utf-8')
+        return self._headers + envelope + self._body
+
+
+class MessageCache:
+    def __init__(self, max_entries=32):
+        """Small LRU of rendered templates, safe to share between send threads"""
+        self.max_entries = max_entries
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        """Return the template cached under key, building it with factory() on a miss"""
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+
+        template = factory()
+
+        with self._lock:
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Durable local outbox for the newsletter mailer
+Every recipient fetched from the site is recorded in a small SQLite (WAL)
+database and moves through queued -> sent -> acked. If a run dies midway,
+the next run resends only what was still queued and replays the
+acknowledgements of emails that went out but never reached the site.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime
+
+QUEUED = 'queued'
+SENT = 'sent'
+ACKED = 'acked'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS announcements (
+    announcement_id INTEGER PRIMARY KEY,
+    subject TEXT NOT NULL,
+    body_html TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    idempotency_key TEXT PRIMARY KEY,
+    announcement_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    sent_at TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_state ON outbox (state, announcement_id, user_id);
+"""
+
+
+def idempotency_key(announcement_id, user_id):
+    """Stable key identifying one delivery of one announcement to one subscriber"""
+    return f"{announcement_id}:{user_id}"
+
+
+class Outbox:
+    def __init__(self, path):
+        """Open (or create) the outbox database at path"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def checkpoint(self):
+        """Fold the write-ahead log back into the database file, so the file alone holds every state"""
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def _write(self, sql, params=()):
+        with self._lock:
+            with self._conn:
+                return self._conn.execute(sql, params)
+
+    def _write_many(self, sql, rows):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(sql, rows)
+
+    def enqueue(self, data):
+        """Record a page of recipients and return the ones that still need sending
+
+        Recipients the outbox already saw as sent, acked or failed are dropped,
+        so a page fetched again after a crash does not cause duplicate emails.
+        """
+        announcement_id = data['announcement_id']
+        now = datetime.utcnow().isoformat()
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO announcements (announcement_id, subject, body_html) VALUES (?, ?, ?)',
+                    (announcement_id, data['subject'], data['body_html'])
+                )
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO outbox (idempotency_key, announcement_id, user_id, email, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [
+                        (idempotency_key(announcement_id, r['user_id']), announcement_id, r['user_id'], r['email'], now)
+                        for r in data['recipients']
+                    ]
+                )
+                queued = {
+                    row['user_id'] for row in self._conn.execute(
+                        'SELECT user_id FROM outbox WHERE announcement_id = ? AND state = ? AND user_id IN (%s)'
+                        % ','.join('?' * len(data['recipients'])),
+                        [announcement_id, QUEUED] + [r['user_id'] for r in data['recipients']]
+                    )
+                } if data['recipients'] else set()
+
+        return [r for r in data['recipients'] if r['user_id'] in queued]
+
+    def mark_sent(self, announcement_id, user_id):
+        now = datetime.utcnow().isoformat()
+        self._write(
+            'UPDATE outbox SET state = ?, attempts = attempts + 1, sent_at = ?, updated_at = ? '
+            'WHERE idempotency_key = ?',
+            (SENT, now, now, idempotency_key(announcement_id, user_id))
+        )
+
+    def mark_attempt_failed(self, announcement_id, user_id, max_attempts):
+        """Count a failed attempt; returns True once the recipient has used up its attempts"""
+        key = idempotency_key(announcement_id, user_id)
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    'UPDATE outbox SET attempts = attempts + 1, updated_at = ? WHERE idempotency_key = ?',
+                    (now, key)
+                )
+                self._conn.execute(
+                    'UPDATE outbox SET state = ? WHERE idempotency_key = ? AND attempts >= ?',
+                    (FAILED, key, max_attempts)
+                )
+                row = self._conn.execute('SELECT state FROM outbox WHERE idempotency_key = ?', (key,)).fetchone()
+        return row is not None and row['state'] == FAILED
+
+    def mark_acked(self, records):
+        """Record that the site stored these acknowledgements"""
+        now = datetime.utcnow().isoformat()
+        self._write_many(
+            'UPDATE outbox SET state = ?, updated_at = ? WHERE idempotency_key = ?',
+            [(ACKED, now, idempotency_key(r['announcement_id'], r['user_id'])) for r in records]
+        )
+
+    def unacked(self):
+        """Acknowledgement records for emails that were sent or given up on but never acked"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT announcement_id, user_id, state, sent_at FROM outbox WHERE state IN (?, ?) '
+                'ORDER BY announcement_id, user_id',
+                (SENT, FAILED)
+            ).fetchall()
+        return [
+            {
+                'user_id': row['user_id'],
+                'announcement_id': row['announcement_id'],
+                'status': row['state'],
+                'sent_at': row['sent_at']
+            }
+            for row in rows
+        ]
+
+    def has_work(self):
+        """True while recipients are still queued or deliveries still unacknowledged"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM outbox WHERE state IN (?, ?, ?) LIMIT 1',
+                (QUEUED, SENT, FAILED)
+            ).fetchone()
+        return row is not None
+
+    def queued_pages(self, page_size):
+        """Yield newsletter pages (same shape as the API's) for recipients left queued by an earlier run"""
+        with self._lock:
+            announcements = self._conn.execute(
+                'SELECT a.announcement_id, a.subject, a.body_html FROM announcements a '
+                'WHERE EXISTS (SELECT 1 FROM outbox o WHERE o.announcement_id = a.announcement_id AND o.state = ?) '
+                'ORDER BY a.announcement_id',
+                (QUEUED,)
+            ).fetchall()
+
+        for announcement in announcements:
+            after_user_id = 0
+            while True:
+                with self._lock:
+                    rows = self._conn.execute(
+                        'SELECT user_id, email FROM outbox WHERE announcement_id = ? AND state = ? AND user_id > ? '
+                        'ORDER BY user_id LIMIT ?',
+                        (announcement['announcement_id'], QUEUED, after_user_id, page_size)
+                    ).fetchall()
+                if not rows:
+                    break
+
+                after_user_id = rows[-1]['user_id']
+                yield {
+                    'announcement_id': announcement['announcement_id'],
+                    'subject': announcement['subject'],
+                    'body_html': announcement['body_html'],
+                    'recipients': [{'user_id': row['user_id'], 'email': row['email']} for row in rows]
+                }
+
+    def prune(self):
+        """Forget acknowledged deliveries and announcements with nothing left to do"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute('DELETE FROM outbox WHERE state = ?', (ACKED,))
+                self._conn.execute(
+                    'DELETE FROM announcements WHERE NOT EXISTS '
+                    '(SELECT 1 FROM outbox o WHERE o.announcement_id = announcements.announcement_id)'
+                )
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Adaptive token-bucket rate limiter for outgoing email
+Sends draw tokens from a bucket refilled at the current rate. The rate is
+halved when the SMTP relay pushes back with a 4xx reply and raised again
+step by step after a run of successful sends. A rate of 0 means unlimited
+until the relay first pushes back; pacing then starts from max_rate.
+"""
+
+import smtplib
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def is_throttle_error(error):
+    """Return True if an SMTP error is a transient (4xx) reply asking us to slow down"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return False
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate=1.0, burst=1, min_rate=0.1, max_rate=None,
+                 increase_after=20, increase_step=None, decrease_factor=0.5):
+        """rate and the bounds are in messages per second (rate 0 = unlimited); burst is the bucket size"""
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate else (rate * 10 or 10.0)
+        self.increase_after = increase_after
+        self.increase_step = increase_step if increase_step is not None else max((rate or self.max_rate) * 0.1, 0.1)
+        self.decrease_factor = decrease_factor
+
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until a send is allowed"""
+        while True:
+            with self._lock:
+                if not self.rate:
+                    return
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        """Speed up gradually after a sustained run of successful sends"""
+        with self._lock:
+            self._successes += 1
+            if self._successes < self.increase_after or not self.rate or self.rate >= self.max_rate:
+                return
+            self._successes = 0
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+            logger.info(f"⏫ Send rate raised to {self.rate:.2f} msg/s")
+
+    def on_throttle(self):
+        """Back off when the relay defers a message"""
+        with self._lock:
+            self._successes = 0
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, (self.rate or self.max_rate) * self.decrease_factor)
+            self._tokens = min(self._tokens, 0.0)
+            logger.warning(f"⏬ Relay pushed back, send rate lowered to {self.rate:.2f} msg/s")
+
+    def record(self, error=None):
+        """Feed the outcome of one send back into the limiter"""
+        if error is None:
+            self.on_success()
+        elif is_throttle_error(error):
+            self.on_throttle()
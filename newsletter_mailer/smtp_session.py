@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Reusable SMTP session for the newsletter mailer
+Keeps one authenticated connection open for a whole batch instead of
+connecting, doing STARTTLS and logging in again for every recipient
+"""
+
+import smtplib
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Reply code a server uses when it is closing the transmission channel
+SMTP_SERVICE_CLOSING = 421
+
+
+def is_connection_error(error):
+    """Return True if the error means the connection itself is unusable"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == SMTP_SERVICE_CLOSING
+    return isinstance(error, (ConnectionError, TimeoutError, OSError)) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPSession:
+    def __init__(self, host, port, username, password, max_messages=100, noop_interval=30, timeout=30, rate=0,
+                 on_pushback=None):
+        """Describe the session; the connection is opened lazily on first send
+
+        on_pushback(error) is called when the server closes the channel with
+        421 and the send is retried on a new connection, so a rate limiter
+        that never sees the recovered error can still back off.
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_messages = max_messages  # 0 means no cap
+        self.noop_interval = noop_interval
+        self.timeout = timeout
+        self.rate = rate  # messages per second on this connection, 0 means unlimited
+        self.on_pushback = on_pushback
+
+        self._server = None
+        self._messages_sent = 0
+        self._last_used = 0.0
+        self._last_send = 0.0
+        self._data_started = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def is_connected(self):
+        return self._server is not None
+
+    def connect(self):
+        """Open, secure and authenticate a new connection"""
+        self.close()
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            server.starttls()
+            server.ehlo()
+            server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+
+        # Note when a send reaches DATA: past that point the server may already have the message
+        send_data = server.data
+
+        def data(msg):
+            self._data_started = True
+            return send_data(msg)
+
+        server.data = data
+        self._server = server
+        self._messages_sent = 0
+        self._last_used = time.monotonic()
+        logger.info(f"🔌 SMTP session opened to {self.host}:{self.port}")
+
+    def close(self):
+        """Close the connection politely, ignoring errors from a dead socket"""
+        if self._server is None:
+            return
+
+        try:
+            self._server.quit()
+        except Exception:
+            self._server.close()
+        finally:
+            self._server = None
+            logger.info(f"🔌 SMTP session closed after {self._messages_sent} messages")
+
+    def _is_healthy(self):
+        """Check an idle connection with NOOP before trusting it again"""
+        if time.monotonic() - self._last_used < self.noop_interval:
+            return True
+
+        try:
+            code, _ = self._server.noop()
+            return code == 250
+        except Exception:
+            return False
+
+    def _ensure_connected(self):
+        """Make sure a live, authenticated connection under the message cap exists"""
+        if self._server is None:
+            self.connect()
+        elif self.max_messages and self._messages_sent >= self.max_messages:
+            logger.info(f"🔄 SMTP session reached {self._messages_sent} messages, reconnecting")
+            self.connect()
+        elif not self._is_healthy():
+            logger.warning("🔄 SMTP session failed health check, reconnecting")
+            self.connect()
+
+    def _pace(self):
+        """Space sends out so this connection stays under its configured rate"""
+        if not self.rate:
+            return
+
+        wait = self._last_send + 1.0 / self.rate - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_send = time.monotonic()
+
+    def _send(self, send_func):
+        """Run a send on the session, reconnecting once if the connection dropped
+
+        The send is only repeated if the connection was lost before DATA;
+        a message that may already have been accepted is never sent twice.
+        """
+        self._pace()
+        for attempt in (1, 2):
+            self._ensure_connected()
+            self._data_started = False
+            try:
+                result = send_func(self._server)
+            except Exception as e:
+                if not is_connection_error(e):
+                    self._last_used = time.monotonic()
+                    raise
+                # The socket is gone or the server is closing the channel
+                self._server.close()
+                self._server = None
+                if attempt == 2 or self._data_started:
+                    raise  # The caller sees (and records) this error itself
+                if self.on_pushback and isinstance(e, smtplib.SMTPResponseException) and e.smtp_code == SMTP_SERVICE_CLOSING:
+                    self.on_pushback(e)
+                logger.warning(f"🔄 SMTP connection lost ({e}), reconnecting")
+                continue
+
+            self._messages_sent += 1
+            self._last_used = time.monotonic()
+            return result
+
+    def send_message(self, msg):
+        """Send an email.message.Message object"""
+        return self._send(lambda server: server.send_message(msg))
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        """Send an already serialized message"""
+        return self._send(lambda server: server.sendmail(from_addr, to_addrs, msg))
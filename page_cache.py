@@ -0,0 +1,82 @@
+"""
+In-process cache for rendered public pages
+A size-bounded LRU whose entries expire after a TTL. Every entry carries
+tags naming the content it was rendered from (e.g. 'news' for the news list,
+'news:5' for one news page), so an admin save can drop exactly the pages
+that showed the changed row. Each worker process keeps its own cache, so
+entries that must follow edits made in other workers carry a version read
+from the shared database and are checked against it on use.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PageCache:
+    def __init__(self, max_entries=256, ttl=300):
+        """ttl is in seconds; a ttl of 0 disables the cache"""
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._keys_by_tag = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def get(self, key):
+        """Return the value cached under key, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags=()):
+        """Cache value under key until the TTL runs out or one of its tags is invalidated"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, value, frozenset(tags))
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of the given tags; returns how many were dropped"""
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._keys_by_tag.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
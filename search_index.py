@@ -0,0 +1,61 @@
+"""
+Text handling for the full-text search index
+Content is indexed, and queries are matched, in a folded form: HTML tags
+removed, lower-cased and stripped of accents, so "Πανηγύρι", "ΠΑΝΗΓΥΡΙ" and
+"πανηγυρι" are the same word. The database (SQLite FTS5 or PostgreSQL
+tsvector) only ever sees folded text; the original is kept for display.
+"""
+
+import html
+import re
+import unicodedata
+
+TAG = re.compile(r'<[^>]+>')
+WHITESPACE = re.compile(r'\s+')
+WORD = re.compile(r'\w+')
+
+MAX_QUERY_TERMS = 8
+EXCERPT_LENGTH = 200
+
+
+def plain_text(content):
+    """Text of possibly HTML content, with tags and entities resolved and whitespace collapsed"""
+    return WHITESPACE.sub(' ', html.unescape(TAG.sub(' ', content or ''))).strip()
+
+
+def fold(text):
+    """Lower-case text and strip its accents (ά -> α, ϊ -> ι, ς -> σ)"""
+    decomposed = unicodedata.normalize('NFD', text.casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def query_terms(query):
+    """Folded words of a search query; the last one may be a prefix of a longer word"""
+    return WORD.findall(fold(query or ''))[:MAX_QUERY_TERMS]
+
+
+def fts5_query(terms):
+    """SQLite FTS5 MATCH expression: every term, each as a prefix"""
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def tsquery(terms):
+    """PostgreSQL to_tsquery expression: every term, each as a prefix"""
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def make_excerpt(text, terms, length=EXCERPT_LENGTH):
+    """About length characters of text around the first matched term"""
+    if len(text) <= length:
+        return text
+
+    folded = fold(text)
+    # fold() keeps one character per character of text for Greek and Latin, so positions line up
+    positions = [folded.find(term) for term in terms if len(folded) == len(text)]
+    start = min((position for position in positions if position >= 0), default=0)
+    start = max(0, start - length // 4)
+    if start:
+        start = text.find(' ', start) + 1 or start
+
+    excerpt = text[start:start + length].rsplit(' ', 1)[0] if start + length < len(text) else text[start:]
+    return ('…' if start else '') + excerpt + ('…' if start + length < len(text) else '')
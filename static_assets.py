@@ -0,0 +1,110 @@
+"""
+Fingerprinted, precompressed static files
+`flask build-assets` copies every file under static/ to a name carrying a
+hash of its content (css/site.css -> css/site.3f2a9c1b04de.css) and writes
+gzip (and, when the brotli package is installed, brotli) copies of the text
+assets next to it. The manifest maps the original names to the fingerprinted
+ones; the app rewrites url_for('static', ...) through it and serves those
+files with far-future immutable cache headers.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_NAME = 'assets-manifest.json'
+HASH_LENGTH = 12
+
+# Only text formats gain from compression; images and video already are compressed
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.xml', '.html', '.ico'}
+MIN_COMPRESS_SIZE = 512  # bytes
+
+# Content-Encoding -> suffix of the precompressed copy, in order of preference
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')] if brotli else [('gzip', '.gz')]
+
+# Uploads saved through the admin are named <uuid4 hex>_<name>, so a name never points at other content
+UNIQUE_UPLOAD_NAME = re.compile(r'^[0-9a-f]{32}_')
+FINGERPRINTED_NAME = re.compile(r'\.[0-9a-f]{%d}\.[^.]+$' % HASH_LENGTH)
+
+
+def is_unique_upload(filename):
+    """True for uploads (and their resized copies) named with the random upload prefix"""
+    return bool(UNIQUE_UPLOAD_NAME.match(os.path.basename(filename)))
+
+
+def fingerprint_filename(filename, digest):
+    """css/site.css -> css/site.<hash>.css"""
+    stem, extension = os.path.splitext(filename)
+    return f"{stem}.{digest[:HASH_LENGTH]}{extension}"
+
+
+def compress_file(path):
+    """Write .gz (and .br) copies of a text asset; returns the encodings written"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    compressors = {'gzip': lambda d: gzip.compress(d, compresslevel=9, mtime=0)}
+    if brotli:
+        compressors['br'] = lambda d: brotli.compress(d, quality=11)
+
+    written = []
+    for encoding, suffix in ENCODINGS:
+        compressed = compressors[encoding](data)
+        if len(compressed) >= len(data):
+            continue  # Not worth sending
+        with open(path + suffix, 'wb') as f:
+            f.write(compressed)
+        written.append(encoding)
+    return written
+
+
+def load_manifest(static_folder):
+    """Original name -> fingerprinted name, empty until build_assets has run"""
+    try:
+        with open(os.path.join(static_folder, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build_assets(static_folder):
+    """Fingerprint and precompress everything under static_folder and write the manifest
+
+    Copies from earlier builds are kept, so pages rendered before a deploy
+    can still load the files they reference.
+    """
+    manifest = {}
+    for root, folders, names in os.walk(static_folder):
+        folders[:] = [folder for folder in folders if not folder.startswith('.')]  # e.g. unfinished uploads
+        for name in names:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            if (filename == MANIFEST_NAME or name.endswith(('.gz', '.br'))
+                    or FINGERPRINTED_NAME.search(name) or is_unique_upload(name) or name.startswith('.')):
+                continue
+
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+
+            fingerprinted = fingerprint_filename(filename, digest)
+            target = os.path.join(static_folder, fingerprinted)
+            if not os.path.exists(target):
+                shutil.copy2(path, target)
+                if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and os.path.getsize(target) >= MIN_COMPRESS_SIZE:
+                    compress_file(target)
+            manifest[filename] = fingerprinted
+
+    # Replace the manifest in one step so a running app never reads half of it
+    manifest_path = os.path.join(static_folder, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
@@ -0,0 +1,129 @@
+"""
+Streaming CSV / NDJSON reading and writing of newsletter subscribers
+Rows are parsed, validated and written one at a time, so importing or
+exporting a list of any size keeps memory flat. The database side (bulk
+upserts, keyset-paginated reads) lives in app.py.
+"""
+
+import codecs
+import csv
+import io
+import json
+import re
+from datetime import datetime
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_FIELDS = ['email', 'is_active', 'subscribed_at', 'welcome_email_sent']
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+MAX_EMAIL_LENGTH = 120  # NewsletterSubscriber.email
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'ναι'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'όχι', ''}
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def format_for(filename, default='csv'):
+    """'ndjson' for .ndjson/.jsonl files, 'csv' for .csv, default otherwise"""
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension, default)
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().casefold()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise InvalidRow(f'not a yes/no value: {value!r}')
+
+
+def parse_datetime(value):
+    try:
+        return datetime.fromisoformat(str(value).strip().replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise InvalidRow(f'not an ISO date: {value!r}')
+
+
+def clean_row(raw):
+    """Validated subscriber values from one input row; only the columns present are returned"""
+    email = str(raw.get('email') or '').strip().lower()
+    if not EMAIL_PATTERN.match(email) or len(email) > MAX_EMAIL_LENGTH:
+        raise InvalidRow(f'invalid email: {email!r}')
+
+    row = {'email': email}
+    if raw.get('is_active') not in (None, ''):
+        row['is_active'] = parse_bool(raw['is_active'])
+    if raw.get('subscribed_at') not in (None, ''):
+        row['subscribed_at'] = parse_datetime(raw['subscribed_at'])
+    return row
+
+
+def read_rows(stream, file_format):
+    """Yield (line number, row or InvalidRow) for every record of a binary stream
+
+    CSV files need a header with an email column (other columns are
+    optional); a file with a single unnamed column is read as plain emails.
+    """
+    text = codecs.getreader('utf-8-sig')(stream, errors='replace')
+
+    if file_format == 'ndjson':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+                if not isinstance(raw, dict):
+                    raw = {'email': raw}
+                yield line_number, clean_row(raw)
+            except ValueError as e:  # Includes InvalidRow and JSON errors
+                yield line_number, InvalidRow(str(e))
+        return
+
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [column.strip().lower() for column in header]
+    if 'email' not in columns:
+        # No header, just addresses: the first line is data too
+        columns = ['email'] + columns[1:]
+        try:
+            yield 1, clean_row(dict(zip(columns, header)))
+        except InvalidRow as e:
+            yield 1, e
+
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        try:
+            yield reader.line_num, clean_row(dict(zip(columns, values)))
+        except InvalidRow as e:
+            yield reader.line_num, e
+
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def csv_lines(rows):
+    """Yield a CSV file (header first) for rows of EXPORT_FIELDS, one line at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow([_export_value(row[field]) for field in EXPORT_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_lines(rows):
+    """Yield one JSON object per line for rows of EXPORT_FIELDS"""
+    for row in rows:
+        yield json.dumps({field: _export_value(row[field]) for field in EXPORT_FIELDS}, ensure_ascii=False) + '\n'